@@ -0,0 +1,549 @@
+"""Benchmark the scheduled posts of both cogs end to end, fully offline.
+
+Loads each cog against a throwaway Red config, a local stand-in for the
+OpenAI image API and fake Discord channels, then runs the same code the
+scheduler runs (``run_slot``) and reports, per scenario:
+
+* wall time,
+* event-loop blocking: total and longest lateness of a 1 ms ticker,
+* peak RSS of the process so far,
+* bytes moved: image API requests/responses, Discord uploads,
+* per pipeline stage (the cogs' own ``Metrics`` stages): p50 latency and,
+  with ``--trace-alloc``, the Python heap high-water mark above the level
+  the stage started at, a proxy for the bytes it copies. Allocation
+  tracing slows everything down, so its timings are not comparable with a
+  normal run; stages that overlap (concurrent sends) share one counter.
+
+The daily quote runs against a synthetic corpus of ``--csv-mb`` megabytes
+(144 by default, like the real ``quotes.csv``), generated once into
+``--workdir`` and reused.
+
+    python benchmarks/pipeline.py [--channels 20] [--api-latency 2]
+        [--payload-kb 2048] [--discord-latency 0.1] [--csv-mb 144]
+        [--trace-alloc] [--json report.json]
+
+Needs the bot's own environment (Red-DiscordBot, openai, Pillow) but no
+network, API key or Discord token.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import itertools
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), "colleaguecogs-benchmark")
+# Chunk size the fake image API streams its response in.
+RESPONSE_CHUNK = 64 * 1024
+# Ticker interval and the lateness below which the loop counts as responsive.
+TICK = 0.001
+BLOCK_THRESHOLD = 0.005
+# Background work a post starts for later (the next quote, the next days'
+# images); it is left out of the post's numbers and finished in between.
+LOOK_AHEAD_TASKS = ("prepare-quote", "countdown-prefetch")
+
+WORDS = (
+    "time life love mind heart world light dream journey silence courage river "
+    "mountain truth wisdom shadow hope fear change moment patience kindness "
+    "memory future past freedom question answer path morning night ocean"
+).split()
+TAGS = ("life", "inspiration", "humor", "wisdom", "romance", "philosophy", "truth", "love", "hope", "books")
+
+
+# -- synthetic corpus ---------------------------------------------------------
+
+def write_corpus(path, megabytes, seed=1):
+    """Write a quotes.csv of about ``megabytes`` MB: quote, author, categories."""
+    rng = random.Random(seed)
+    target = megabytes * 1024 * 1024
+    authors = [f"Author {number}" for number in range(5000)]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as file:
+        file.write("quote,author,category\n")
+        written = 0
+        while written < target:
+            words = rng.choices(WORDS, k=rng.randint(8, 60))
+            quote = " ".join(words).capitalize() + "."
+            if rng.random() < 0.02:
+                # Multi-line quotes exercise the quoted-newline handling.
+                quote = quote.replace(" ", "\n", 1)
+            tags = ", ".join(rng.sample(TAGS, rng.randint(1, 4)))
+            line = f'"{quote}",{rng.choice(authors)},"{tags}"\n'
+            file.write(line)
+            written += len(line)
+    os.replace(tmp_path, path)
+
+
+def ensure_corpus(workdir, megabytes):
+    path = os.path.join(workdir, f"quotes-{megabytes}mb.csv")
+    if not os.path.exists(path):
+        print(f"Writing a {megabytes} MB synthetic corpus to {path}")
+        write_corpus(path, megabytes)
+    return path
+
+
+# -- fake image API -----------------------------------------------------------
+
+def make_payload(kilobytes):
+    """A PNG of random noise of roughly ``kilobytes`` KB, so Pillow has real work to do."""
+    from PIL import Image
+
+    side = max(int((kilobytes * 1024 / 3) ** 0.5), 16)
+    image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    out = io.BytesIO()
+    image.save(out, "PNG", compress_level=1)
+    return out.getvalue()
+
+
+class FakeImageAPI:
+    """``/v1/images/generations`` and ``/v1/images/edits`` on localhost.
+
+    Every request is answered after ``latency`` seconds with the same
+    image as ``b64_json``, streamed in chunks like the real API. Runs on
+    its own threads, so it never shows up as event-loop blocking.
+    """
+
+    def __init__(self, latency, payload):
+        self.latency = latency
+        self.body_prefix = b'{"created": 0, "data": [{"b64_json": "'
+        self.body_image = base64.b64encode(payload)
+        self.body_suffix = b'"}]}'
+        self.requests = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self._lock = threading.Lock()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                received = api.read_body(self)
+                time.sleep(api.latency)
+                length = len(api.body_prefix) + len(api.body_image) + len(api.body_suffix)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(length))
+                self.end_headers()
+                self.wfile.write(api.body_prefix)
+                for start in range(0, len(api.body_image), RESPONSE_CHUNK):
+                    self.wfile.write(api.body_image[start:start + RESPONSE_CHUNK])
+                self.wfile.write(api.body_suffix)
+                with api._lock:
+                    api.requests += 1
+                    api.request_bytes += received
+                    api.response_bytes += length
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @staticmethod
+    def read_body(handler):
+        if handler.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            received = 0
+            while True:
+                size = int(handler.rfile.readline().strip() or b"0", 16)
+                handler.rfile.read(size + 2)
+                received += size
+                if size == 0:
+                    return received
+        length = int(handler.headers.get("Content-Length") or 0)
+        handler.rfile.read(length)
+        return length
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def counters(self):
+        with self._lock:
+            return {
+                "api_requests": self.requests,
+                "api_request_bytes": self.request_bytes,
+                "api_response_bytes": self.response_bytes,
+            }
+
+
+# -- fake Discord -------------------------------------------------------------
+
+class FakeAttachment:
+    def __init__(self, channel_id, message_id, filename):
+        expires = int(time.time()) + 24 * 3600
+        self.url = f"https://cdn.discordapp.com/attachments/{channel_id}/{message_id}/{filename}?ex={expires:x}"
+
+
+class FakeMessage:
+    def __init__(self, discord_, channel, message_id, attachments):
+        self.discord = discord_
+        self.channel = channel
+        self.id = message_id
+        self.attachments = attachments
+
+    async def add_reaction(self, emoji):
+        await asyncio.sleep(self.discord.latency)
+        self.discord.reactions += 1
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.emojis = [f"emoji{number}" for number in range(5)]
+
+
+class FakeChannel:
+    def __init__(self, discord_, channel_id, guild):
+        self.discord = discord_
+        self.id = channel_id
+        self.guild = guild
+        self.messages = {}
+
+    async def send(self, content=None, embed=None, file=None):
+        message_id = next(self.discord.ids)
+        attachments = []
+        if file is not None:
+            # What discord.py would put on the wire.
+            data = file.fp.read()
+            self.discord.uploaded_bytes += len(data)
+            self.discord.uploads += 1
+            attachments.append(FakeAttachment(self.id, message_id, file.filename))
+        await asyncio.sleep(self.discord.latency)
+        message = FakeMessage(self.discord, self, message_id, attachments)
+        self.messages[message_id] = message
+        self.discord.messages += 1
+        return message
+
+    async def fetch_message(self, message_id):
+        await asyncio.sleep(self.discord.latency)
+        return self.messages[message_id]
+
+
+class FakeBot:
+    """The parts of ``Red`` the cogs use, over in-memory channels.
+
+    A ``cached`` fraction of the channels is in the gateway cache
+    (``get_channel``); the rest has to be fetched over "REST".
+    """
+
+    def __init__(self, channels, latency, cached=0.5, first_id=1000):
+        self.latency = latency
+        self.ids = itertools.count(10 ** 6)
+        self.channels = {}
+        self.cached = set()
+        self.uploads = self.uploaded_bytes = self.messages = self.reactions = self.rest_fetches = 0
+        for number in range(channels):
+            channel_id = first_id + number
+            self.channels[channel_id] = FakeChannel(self, channel_id, FakeGuild(channel_id))
+            if number < channels * cached:
+                self.cached.add(channel_id)
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id) if channel_id in self.cached else None
+
+    async def fetch_channel(self, channel_id):
+        await asyncio.sleep(self.latency)
+        self.rest_fetches += 1
+        return self.channels[channel_id]
+
+    async def wait_until_red_ready(self):
+        return
+
+    def counters(self):
+        return {
+            "discord_messages": self.messages,
+            "discord_uploads": self.uploads,
+            "discord_uploaded_bytes": self.uploaded_bytes,
+            "discord_reactions": self.reactions,
+            "discord_rest_fetches": self.rest_fetches,
+        }
+
+
+# -- measurement --------------------------------------------------------------
+
+class LoopMonitor:
+    """How long the event loop was blocked: the lateness of a ``TICK`` ticker."""
+
+    def __init__(self):
+        self.blocked = 0.0
+        self.longest = 0.0
+        self._task = None
+
+    async def _tick(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(TICK)
+            late = loop.time() - started - TICK
+            if late > BLOCK_THRESHOLD:
+                self.blocked += late
+                self.longest = max(self.longest, late)
+
+    def __enter__(self):
+        self._task = asyncio.ensure_future(self._tick())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def trace_stages(metrics, peaks):
+    """Record each stage's heap high-water mark in ``peaks`` (needs tracemalloc running)."""
+    stage = metrics.stage
+
+    @contextmanager
+    def traced(name):
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            with stage(name):
+                yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            peaks[name] = max(peaks.get(name, 0), peak - start)
+
+    metrics.stage = traced
+
+
+def stage_report(metrics, peaks):
+    stages = {}
+    for (name, labels), histogram in metrics.histograms.items():
+        if name != "stage_seconds":
+            continue
+        stage = dict(labels)["stage"]
+        stages[stage] = {
+            "count": histogram.count,
+            "p50_s": statistics.median(histogram.recent),
+            "peak_alloc_bytes": peaks.get(stage),
+        }
+    return stages
+
+
+async def measure(name, coro, cog, fakes, peaks):
+    """Run ``coro`` and collect the scenario's numbers."""
+    before = {}
+    for fake in fakes:
+        before.update(fake.counters())
+    cog.metrics.histograms.clear()
+    peaks.clear()
+
+    with LoopMonitor() as monitor:
+        started = time.perf_counter()
+        await coro
+        wall = time.perf_counter() - started
+        # Follow-ups (reactions) belong to the post; let them finish inside the window.
+        await asyncio.gather(
+            *(task for task in cog.scheduler.tasks if task.get_name() not in LOOK_AHEAD_TASKS),
+            return_exceptions=True,
+        )
+
+    result = {
+        "scenario": name,
+        "wall_s": wall,
+        "loop_blocked_s": monitor.blocked,
+        "loop_longest_block_s": monitor.longest,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    for fake in fakes:
+        for key, value in fake.counters().items():
+            result[key] = value - before.get(key, 0)
+    result["stages"] = stage_report(cog.metrics, peaks)
+    await asyncio.gather(*cog.scheduler.tasks, return_exceptions=True)
+    return result
+
+
+# -- scenarios ----------------------------------------------------------------
+
+def setup_red(workdir):
+    """Point Red's data manager at a scratch directory with the JSON driver."""
+    from redbot.core import data_manager
+
+    data_manager.basic_config = {
+        **data_manager.basic_config_default,
+        "DATA_PATH": os.path.join(workdir, "red"),
+        "STORAGE_TYPE": "JSON",
+        "STORAGE_DETAILS": {},
+    }
+
+
+async def subscribe(cog, bot):
+    for channel_id in bot.channels:
+        await cog.config.guild_from_id(channel_id).channel_id.set(channel_id)
+
+
+async def reset_ledger(cog, bot):
+    for channel_id in bot.channels:
+        await cog.config.guild_from_id(channel_id).last_run.set(None)
+
+
+async def bench_dailyquote(args, workdir, api, peaks):
+    from dailyquote.dailyquote import IMAGE_CACHE_MAX_BYTES, TIMEZONE, DailyQuoteCog
+    from dailyquote.imagecache import ImageCache
+    from dailyquote.prepared import PreparedQuoteStore
+    from dailyquote.quoteindex import QuoteIndex
+    from dailyquote.quotestore import QuoteStore
+
+    csv_path = ensure_corpus(workdir, args.csv_mb)
+    state = os.path.join(workdir, "dailyquote")
+    shutil.rmtree(state, ignore_errors=True)
+    os.makedirs(state)
+
+    bot = FakeBot(args.channels, args.discord_latency, args.cached)
+    cog = DailyQuoteCog(bot)
+    generated = os.path.join(state, "generated")
+    cog.prepared = PreparedQuoteStore(generated)
+    cog.current = PreparedQuoteStore(generated, name="current_quote")
+    cog.image_cache = ImageCache(os.path.join(generated, "cache"), IMAGE_CACHE_MAX_BYTES)
+    cog.quotes_path = csv_path
+    cog.quote_index = QuoteIndex(csv_path, os.path.join(state, "quotes.csv.idx"))
+    cog.quote_store = QuoteStore(os.path.join(state, "quotes.db"), csv_path)
+    cog.api_key = "offline-benchmark"
+    cog.images.set_api_key(cog.api_key)
+    if args.trace_alloc:
+        trace_stages(cog.metrics, peaks)
+
+    await cog.load_settings()
+    await cog.image_cache.load()
+    await subscribe(cog, bot)
+    post_time = cog.current_cron_time
+    day = datetime.now(TIMEZONE).replace(hour=post_time[0], minute=post_time[1], second=0, microsecond=0)
+    fakes = (api, bot)
+    loop = asyncio.get_running_loop()
+
+    results = [
+        await measure("quote: build offset index", loop.run_in_executor(
+            cog.quote_executor, cog.quote_index.ensure), cog, fakes, peaks),
+        # Nothing prepared yet: the image is generated while the post waits.
+        await measure("quote: post, generated inline", cog.run_slot(post_time, day), cog, fakes, peaks),
+        # That post prepared the next day's quote in the background.
+        await measure("quote: post, prepared", cog.run_slot(post_time, day + timedelta(days=1)), cog, fakes, peaks),
+    ]
+    await cog.cog_unload()
+    return results
+
+
+async def bench_countdown(args, workdir, api, peaks):
+    from countdown.countdown import IMAGE_CACHE_MAX_BYTES, HolidayCountdown
+    from countdown.imagecache import ImageCache
+
+    state = os.path.join(workdir, "countdown")
+    shutil.rmtree(state, ignore_errors=True)
+    os.makedirs(state)
+
+    bot = FakeBot(args.channels, args.discord_latency, args.cached)
+    cog = HolidayCountdown(bot)
+    cog.image_cache = ImageCache(os.path.join(state, "generated"), IMAGE_CACHE_MAX_BYTES)
+    cog.images.set_api_key("offline-benchmark")
+    if args.trace_alloc:
+        trace_stages(cog.metrics, peaks)
+
+    await cog.load_settings()
+    # Only the measured post may call the image API.
+    cog.prefetch_days = 0
+    await cog.image_cache.load()
+    await subscribe(cog, bot)
+    post_time = (cog.hour, cog.minute)
+    # A day inside the countdown, so there is something to post.
+    day = datetime.combine(cog.start_date + timedelta(days=10), datetime.min.time()).replace(
+        hour=post_time[0], minute=post_time[1], tzinfo=cog.timezone
+    )
+    fakes = (api, bot)
+
+    results = [await measure("countdown: post, generated", cog.run_slot(post_time, day), cog, fakes, peaks)]
+    await reset_ledger(cog, bot)
+    results.append(await measure("countdown: post again, cached", cog.run_slot(post_time, day), cog, fakes, peaks))
+    await cog.cog_unload()
+    return results
+
+
+# -- report -------------------------------------------------------------------
+
+def print_report(results):
+    for result in results:
+        print(f"\n{result['scenario']}")
+        print(f"  wall {result['wall_s']:8.3f} s   loop blocked {result['loop_blocked_s']:7.3f} s"
+              f" (longest {result['loop_longest_block_s'] * 1000:.1f} ms)   peak RSS {result['peak_rss_mb']:.0f} MB")
+        print(f"  image API: {result['api_requests']} requests, {result['api_request_bytes'] / 1024:.0f} KB up,"
+              f" {result['api_response_bytes'] / 1024:.0f} KB down")
+        print(f"  discord: {result['discord_messages']} messages, {result['discord_uploads']} uploads"
+              f" ({result['discord_uploaded_bytes'] / 1024:.0f} KB), {result['discord_reactions']} reactions,"
+              f" {result['discord_rest_fetches']} channel fetches")
+        for stage, numbers in sorted(result["stages"].items()):
+            alloc = numbers["peak_alloc_bytes"]
+            alloc_text = f"  peak alloc {alloc / 1024:8.0f} KB" if alloc is not None else ""
+            print(f"    {stage:<16} n={numbers['count']:<4} p50 {numbers['p50_s']:7.3f} s{alloc_text}")
+
+
+async def run(args):
+    os.makedirs(args.workdir, exist_ok=True)
+    setup_red(args.workdir)
+
+    api = FakeImageAPI(args.api_latency, make_payload(args.payload_kb))
+    api.start()
+    os.environ["OPENAI_BASE_URL"] = api.base_url
+    peaks = {}
+    if args.trace_alloc:
+        tracemalloc.start()
+
+    try:
+        results = await bench_dailyquote(args, args.workdir, api, peaks)
+        results += await bench_countdown(args, args.workdir, api, peaks)
+    finally:
+        api.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=20, help="subscribed channels per cog")
+    parser.add_argument("--cached", type=float, default=0.5, help="fraction of channels in the gateway cache")
+    parser.add_argument("--api-latency", type=float, default=2.0, help="seconds per image API request")
+    parser.add_argument("--payload-kb", type=int, default=2048, help="size of the returned image")
+    parser.add_argument("--discord-latency", type=float, default=0.1, help="seconds per Discord call")
+    parser.add_argument("--csv-mb", type=int, default=144, help="size of the synthetic quotes.csv")
+    parser.add_argument("--trace-alloc", action="store_true", help="record heap high-water marks per stage")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    results = asyncio.run(run(args))
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Measure how much the cogs add to bot startup.
+
+Imports each cog package in a fresh interpreter after the imports Red has
+already paid for (discord.py and the redbot.core modules the cogs use),
+times only the cog's own import, and checks that it doesn't pull in a
+heavy dependency that is only needed once the cog actually generates or
+posts something.
+
+    python benchmarks/startup.py [--runs 15] [--max-ms 50]
+
+Exits non-zero if a cog's median import cost goes over ``--max-ms`` or an
+import drags in one of ``HEAVY_MODULES``.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGES = ("dailyquote", "countdown")
+# Modules the cogs only need once they actually generate or post something.
+HEAVY_MODULES = ("openai", "httpx", "PIL", "pytz", "aiohttp")
+# Already imported by Red before any cog loads.
+BASELINE_IMPORTS = (
+    "import discord, redbot.core, redbot.core.bot, redbot.core.commands,"
+    " redbot.core.utils.chat_formatting, redbot.core.utils.menus"
+)
+
+PROBE = """
+import json, sys, time
+{baseline}
+before = set(sys.modules)
+start = time.perf_counter()
+{target}
+elapsed = time.perf_counter() - start
+# Only packages the cog brought in itself; submodules of ones Red already
+# loaded (e.g. aiohttp.web) don't count as a new heavy dependency.
+loaded = {{name.partition(".")[0] for name in set(sys.modules) - before}}
+loaded -= {{name.partition(".")[0] for name in before}}
+print(json.dumps({{
+    "ms": elapsed * 1000,
+    "heavy": sorted(name for name in {heavy!r} if name in loaded),
+}}))
+"""
+
+
+def probe(target):
+    code = PROBE.format(baseline=BASELINE_IMPORTS, target=target, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    failed = False
+    for package in PACKAGES:
+        samples = [probe(f"import {package}") for _ in range(args.runs)]
+        median = statistics.median(sample["ms"] for sample in samples)
+        heavy = samples[0]["heavy"]
+
+        print(f"{package:12} import {median:7.1f} ms (median of {args.runs})"
+              + (f"  heavy modules: {', '.join(heavy)}" if heavy else ""))
+        if median > args.max_ms or heavy:
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,14 @@
 import asyncio
-from datetime import datetime, date
-from io import BytesIO
+import functools
+import io
+from datetime import datetime, date, timedelta
+from zoneinfo import ZoneInfo
 
-import aiocron
 import discord
-import pytz
 
 import json
 
 import os
-import base64
-from openai import OpenAI
 API_KEY_FILE = (
     "/home/colleague/bot/cogs/"
     "CogManager/cogs/"
@@ -19,9 +17,72 @@ API_KEY_FILE = (
 )
 
 
-from redbot.core import commands
+from redbot.core import Config, commands
+from redbot.core.utils.chat_formatting import box
 from redbot.core.bot import Red
 
+from .delivery import AttachmentCache, Delivery
+from .imagecache import FileDigest, ImageCache, cache_key
+from .imageservice import ImageService
+from .metrics import Metrics, format_summary
+from .scheduler import Scheduler
+from .singleflight import SingleFlight
+from .imaging import (
+    FORMAT_EXTENSIONS,
+    IMAGE_FORMATS,
+    IMAGE_QUALITIES,
+    IMAGE_SIZES,
+    UPLOAD_MAX_BYTES,
+    compress_for_upload,
+    has_pil,
+    prepare_reference_image,
+    render_board,
+    render_text_card,
+    upload_format,
+)
+
+
+IMAGE_MODEL = "gpt-image-2"
+# Output parameters sent with every images.edit call.
+DEFAULT_IMAGE_OPTIONS = {
+    "size": "1536x1024",
+    "quality": "auto",
+    "output_format": "webp",
+    "output_compression": 85,
+}
+# The template is downscaled to this longest side before it is uploaded.
+TEMPLATE_MAX_SIDE = 1536
+# Upper bound for the generated image cache before LRU eviction kicks in.
+IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Seconds between checks of the template file for changes.
+TEMPLATE_CHECK_INTERVAL = 60
+# "hybrid": one AI scene per activity, cached for good, with the day's
+# board drawn over it locally. "full": the API redraws everything daily.
+RENDER_MODES = ("hybrid", "full")
+BOARD_TITLE = "MALAGA 2026"
+# The template's blank wooden board and the calendar card pinned to it,
+# as (left, top, right, bottom) fractions; the day's board is drawn there,
+# clear of the man on the right.
+BOARD_BOX = (0.046, 0.058, 0.58, 0.85)
+CALENDAR_BOX = (0.089, 0.28, 0.273, 0.735)
+
+# Channel the cog posted to before per-guild settings; migrated on first load.
+DEFAULT_CHANNEL_ID = 202397765941198848
+# A countdown missed while the bot was down is still sent if it loads within this window.
+CATCH_UP_WINDOW = timedelta(hours=12)
+
+# How many upcoming days the background prefetch keeps rendered.
+PREFETCH_DAYS = 7
+# Max concurrent images.edit calls during prefetch.
+PREFETCH_CONCURRENCY = 2
+# Minimum seconds between starting two prefetch generations.
+PREFETCH_INTERVAL = 15
+# Attempts per day before the prefetch gives up until its next run.
+PREFETCH_ATTEMPTS = 3
+
+# Seconds a post waits for the AI image before sending the locally drawn card.
+POST_DEADLINE = 90
+
 
 COUNTDOWN_FACTS = {
     53: "53 dienos – maždaug tiek truko Apollo 11 astronautų pasiruošimo simuliacijos prieš nusileidimą Mėnulyje.",
@@ -144,12 +205,41 @@ class HolidayCountdown(commands.Cog):
     def __init__(self, bot: Red):
         self.bot = bot
 
-        self.channel_id = 202397765941198848
+        self.config = Config.get_conf(
+            self,
+            identifier=202397765941198850,
+            force_registration=True
+        )
+
+        self.config.register_global(
+            # Legacy single-channel settings, moved to the channel's guild on load.
+            channel_id=DEFAULT_CHANNEL_ID,
+            last_run=None,
+            # Default time for guilds that haven't set their own.
+            hour=8,
+            minute=0,
+            upload_max_bytes=UPLOAD_MAX_BYTES,
+            image_options=DEFAULT_IMAGE_OPTIONS,
+            render_mode="hybrid",
+            prefetch_days=PREFETCH_DAYS,
+            prefetch_concurrency=PREFETCH_CONCURRENCY,
+            # Where a metrics snapshot is written after every post (.json or Prometheus text).
+            metrics_export_path=None
+        )
+
+        self.config.register_guild(
+            channel_id=None,
+            # None means the default time.
+            hour=None,
+            minute=None,
+            # Run ledger: date of the last scheduled countdown posted in this guild.
+            last_run=None
+        )
 
         self.start_date = date(2026, 5, 8)
         self.holiday_date = date(2026, 6, 30)
 
-        self.timezone = pytz.timezone(
+        self.timezone = ZoneInfo(
             "Europe/London"
         )
 
@@ -161,42 +251,390 @@ class HolidayCountdown(commands.Cog):
         self.hour = 8
         self.minute = 0
         self.api_key = None
-        self.client = None
 
+        # Stage latencies and counters for the generate -> upload pipeline.
+        self.metrics = Metrics(
+            "countdown"
+        )
+        self.metrics_export_path = None
+
+        # One pooled async OpenAI session for every image request
+        self.images = ImageService(
+            metrics=self.metrics
+        )
+
+
+        # Runs the daily job and tracks every background task of the cog.
+        self.scheduler = Scheduler(
+            self.timezone
+        )
+
+        # Resolves channels (cache first, REST memoised) and sends to them.
+        self.delivery = Delivery(
+            bot,
+            self.scheduler.spawn,
+            metrics=self.metrics
+        )
+
+        current_dir = os.path.dirname(
+            os.path.abspath(__file__)
+        )
+
+        self.template_path = os.path.join(
+            current_dir,
+            "malaga_background.png"
+        )
+
+        # The template rarely changes; stat it at most once a minute.
+        self.template_digest = FileDigest(
+            self.template_path,
+            max_age=TEMPLATE_CHECK_INTERVAL
+        )
+
+        # (digest, (filename, bytes, mime)) of the downscaled template.
+        self._template_upload = None
+
+        self.image_options = dict(
+            DEFAULT_IMAGE_OPTIONS
+        )
+
+        self.render_mode = "hybrid"
+
+        self.image_cache = ImageCache(
+            os.path.join(
+                current_dir,
+                "generated"
+            ),
+            IMAGE_CACHE_MAX_BYTES
+        )
+
+        self.upload_max_bytes = UPLOAD_MAX_BYTES
+
+        self.prefetch_days = PREFETCH_DAYS
+        self.prefetch_concurrency = (
+            PREFETCH_CONCURRENCY
+        )
+        self.prefetch_interval = (
+            PREFETCH_INTERVAL
+        )
+        self.prefetch_task = None
+        self._rate_lock = asyncio.Lock()
+        self._next_request_at = 0.0
+        # Concurrent requests for the same image share one generation.
+        self._generations = SingleFlight()
+
+        # Where each uploaded image already lives on Discord's CDN, per
+        # channel, so repeat commands there link to it instead of uploading
+        # it again.
+        self.attachments = AttachmentCache()
+        self._upload_lock = asyncio.Lock()
+
+    async def cog_load(self):
+        # Nothing blocking here: the key file is read in a thread, the
+        # template and image clients are prepared on first use.
+        await asyncio.to_thread(
+            self.load_api_key
+        )
+
+        await self.load_settings()
+        await self.refresh_schedule()
+
+        self.scheduler.spawn(
+            self.catch_up_missed_run(),
+            name="countdown-catch-up"
+        )
+
+        self.scheduler.spawn(
+            self._warm_up(),
+            name="countdown-warm-up"
+        )
+
+    async def _warm_up(self):
+        # Let the bot (and the other cogs) finish loading first.
+        await self.bot.wait_until_red_ready()
+
+        if self.images.has_key:
+            # Import openai and build the client now, not during the first post.
+            await self.images.ensure_client()
+
+        await self.image_cache.load()
+        self.schedule_prefetch()
+
+        # Have today's post in memory before the scheduled send.
+        try:
+            await self.warm_countdown_image(
+                datetime.now(
+                    self.timezone
+                ).date()
+            )
+        except Exception as e:
+            print(
+                f"Cache warm-up error: {e}"
+            )
+
+    async def cog_unload(self):
+        await self.scheduler.shutdown()
+        await self.images.close()
+        await self.image_cache.flush()
+
+    async def load_settings(self):
+        settings = await self.config.all()
+
+        self.hour = settings["hour"]
+        self.minute = settings["minute"]
+        self.upload_max_bytes = settings[
+            "upload_max_bytes"
+        ]
+        self.image_options = dict(
+            settings["image_options"]
+        )
+        self.render_mode = settings[
+            "render_mode"
+        ]
+        self.prefetch_days = settings[
+            "prefetch_days"
+        ]
+        self.prefetch_concurrency = settings[
+            "prefetch_concurrency"
+        ]
+        self.metrics_export_path = settings[
+            "metrics_export_path"
+        ]
+
+    async def subscriptions(self):
+        """Maps each post time (hour, minute) to its (guild_id, channel_id) list."""
+
+        slots = {}
+
+        for guild_id, data in (
+            await self.config.all_guilds()
+        ).items():
+            if not data["channel_id"]:
+                continue
+
+            if data["hour"] is None:
+                post_time = (self.hour, self.minute)
+            else:
+                post_time = (
+                    data["hour"],
+                    data["minute"]
+                )
+
+            slots.setdefault(
+                post_time,
+                []
+            ).append(
+                (guild_id, data["channel_id"])
+            )
+
+        return slots
+
+    @staticmethod
+    def slot_job_name(
+        post_time
+    ):
+        return (
+            f"countdown-{post_time[0]:02}:"
+            f"{post_time[1]:02}"
+        )
+
+    async def refresh_schedule(self):
+        """Keeps one scheduler job per distinct post time in use."""
+
+        wanted = {
+            self.slot_job_name(post_time): post_time
+            for post_time in await self.subscriptions()
+        }
+
+        for name in list(self.scheduler.jobs):
+            if name not in wanted:
+                self.scheduler.remove(name)
+
+        for name, (hour, minute) in wanted.items():
+            # An existing job keeps its in-flight run,
+            # so a send never overlaps itself.
+            if name not in self.scheduler.jobs:
+                self.scheduler.add_daily(
+                    name,
+                    hour,
+                    minute,
+                    functools.partial(
+                        self.run_slot,
+                        (hour, minute)
+                    )
+                )
+
+    @staticmethod
+    def last_slot(
+        now,
+        post_time
+    ):
+        """Most recent post_time at or before now."""
+
+        slot = now.replace(
+            hour=post_time[0],
+            minute=post_time[1],
+            second=0,
+            microsecond=0
+        )
+
+        if slot > now:
+            slot -= timedelta(days=1)
+
+        return slot
+
+    async def claim_run(
+        self,
+        guild_id,
+        slot
+    ):
+        """Records the slot in the guild's run ledger; False if it already ran."""
 
-        self.cron = None
-        
-        self.load_api_key()
+        key = slot.date().isoformat()
+        guild_config = self.config.guild_from_id(
+            guild_id
+        )
+        last_run = await guild_config.last_run()
 
+        if (
+            last_run is not None
+            and last_run >= key
+        ):
+            return False
 
-        self.set_cron_job(
-            self.hour,
-            self.minute
+        await guild_config.last_run.set(
+            key
         )
 
-    def set_cron_job(
+        return True
+
+    async def run_slot(
         self,
-        hour,
-        minute
+        post_time,
+        slot=None
     ):
-        if self.cron:
-            self.cron.stop()
+        """Sends the countdown to every channel scheduled at post_time, once each."""
+
+        if slot is None:
+            slot = self.last_slot(
+                datetime.now(
+                    self.timezone
+                ),
+                post_time
+            )
+
+        channel_ids = []
+
+        for guild_id, channel_id in (
+            await self.subscriptions()
+        ).get(post_time, []):
+            if await self.claim_run(
+                guild_id,
+                slot
+            ):
+                channel_ids.append(
+                    channel_id
+                )
 
-        self.hour = hour
-        self.minute = minute
+        if not channel_ids:
+            return
 
-        cron_expr = (
-            f"{minute} {hour} * * *"
+        # Generated once, then uploaded to every channel.
+        post = await self.build_countdown_post(
+            slot.date()
         )
 
-        self.cron = aiocron.crontab(
-            cron_expr,
-            func=lambda: asyncio.create_task(
-                self.send_countdown()
-            ),
-            start=True
+        if post is not None:
+            results = await self.delivery.fan_out(
+                channel_ids,
+                functools.partial(
+                    self.send_countdown,
+                    upload_path=post
+                )
+            )
+
+            for channel_id, result in zip(
+                channel_ids,
+                results
+            ):
+                if isinstance(result, Exception):
+                    print(
+                        f"Send error ({channel_id}): {result}"
+                    )
+
+        await self.export_metrics()
+
+        # Keep the next days rendered ahead of time.
+        self.schedule_prefetch()
+
+    async def migrate_legacy_channel(self):
+        """Moves the pre-guild global channel setting to its guild."""
+
+        channel_id = await self.config.channel_id()
+
+        if channel_id is None:
+            return
+
+        channel = self.bot.get_channel(
+            channel_id
+        )
+
+        if channel is None:
+            return
+
+        guild_config = self.config.guild(
+            channel.guild
+        )
+
+        if await guild_config.channel_id() is None:
+            await guild_config.channel_id.set(
+                channel_id
+            )
+            await guild_config.last_run.set(
+                await self.config.last_run()
+            )
+
+        await self.config.channel_id.set(None)
+        await self.refresh_schedule()
+
+    async def catch_up_missed_run(self):
+        """Sends today's countdown once in each guild that missed it while offline."""
+
+        await self.bot.wait_until_red_ready()
+        await self.migrate_legacy_channel()
+
+        now = datetime.now(
+            self.timezone
         )
 
+        for post_time, targets in (
+            await self.subscriptions()
+        ).items():
+            slot = self.last_slot(
+                now,
+                post_time
+            )
+
+            for guild_id, _ in targets:
+                guild_config = self.config.guild_from_id(
+                    guild_id
+                )
+
+                if await guild_config.last_run() is None:
+                    # New subscription: start the ledger instead of posting right away.
+                    await guild_config.last_run.set(
+                        slot.date().isoformat()
+                    )
+
+            if (
+                now - slot <= CATCH_UP_WINDOW
+                and slot.date() == now.date()
+            ):
+                await self.run_slot(
+                    post_time,
+                    slot
+                )
+
     def lithuanian_days(
         self,
         days: int
@@ -217,45 +655,47 @@ class HolidayCountdown(commands.Cog):
 
         return "dienų"
 
-    async def generate_countdown_image(
+    def countdown_for_date(
         self,
-        days_left,
-        progress_percent,
-        fact
+        day
     ):
-        current_dir = os.path.dirname(
-            os.path.abspath(__file__)
-        )
+        """Returns (days_left, progress_percent, fact) for a date."""
 
-        cache_dir = os.path.join(
-            current_dir,
-            "generated"
-        )
+        days_left = (
+            self.holiday_date
+            - day
+        ).days
 
-        os.makedirs(
-            cache_dir,
-            exist_ok=True
-        )
+        days_passed = (
+            day
+            - self.start_date
+        ).days
 
-        cached_file = os.path.join(
-            cache_dir,
-            f"day_{days_left}.png"
+        progress_percent = round(
+            (
+                days_passed
+                / self.total_days
+            )
+            * 100
         )
 
-        if os.path.exists(
-            cached_file
-        ):
-            with open(
-                cached_file,
-                "rb"
-            ) as f:
-                return f.read()
+        fact = COUNTDOWN_FACTS.get(
+            days_left,
+            "Kiekviena diena priartina prie Malagos."
+        )
 
-        template_path = os.path.join(
-            current_dir,
-            "malaga_background.png"
+        return (
+            days_left,
+            progress_percent,
+            fact
         )
 
+    def build_prompt(
+        self,
+        days_left,
+        progress_percent,
+        fact
+    ):
         activity = (
             COUNTDOWN_ACTIVITIES.get(
                 days_left,
@@ -263,19 +703,7 @@ class HolidayCountdown(commands.Cog):
             )
         )
 
-        try:
-
-            def _generate():
-
-                with open(
-                    template_path,
-                    "rb"
-                ) as img:
-
-                    return self.client.images.edit(
-                        model="gpt-image-2",
-                        image=img,
-                        prompt=f"""
+        return f"""
 Use this exact image as base template.
 
 IMPORTANT IDENTITY LOCK:
@@ -336,117 +764,572 @@ Photorealistic.
 HARD RULE:
 Do not alter the man's face or identity.
 """
-                    )
 
-            response = await asyncio.to_thread(
-                _generate
-            )
+    def build_scene_prompt(
+        self,
+        days_left
+    ):
+        """Prompt for the day's scene alone; the board is drawn over it locally."""
 
-            if (
-                response
-                and response.data
-            ):
-                image_bytes = (
-                    base64.b64decode(
-                        response.data[0]
-                        .b64_json
-                    )
-                )
+        activity = (
+            COUNTDOWN_ACTIVITIES.get(
+                days_left,
+                "relaxing"
+            )
+        )
 
-                with open(
-                    cached_file,
-                    "wb"
-                ) as f:
-                    f.write(
-                        image_bytes
-                    )
+        return f"""
+Use this exact image as base template.
 
-                return image_bytes
+IMPORTANT IDENTITY LOCK:
+- Preserve the same exact man's face and head shape.
+- Do not change his identity, facial structure, eyes, nose, jawline, hairstyle, or age appearance.
+- Keep him clearly recognizable as the same person from the reference image.
 
-        except Exception as e:
-            print(
-                f"Generation error: {e}"
-            )
+Preserve:
+- same recognizable young man
+- same festive robots
+- same tractor
+- same terrace
+- same warm Malaga sunset
+- same cinematic visual identity
 
-        return None
+Today the man is:
 
-    async def send_countdown(
-        self,
-        custom_channel=None
-    ):
-        if not self.client:
-            return
+{activity}
 
-        try:
+His behaviour is absurd, surreal and overdramatic,
+while staying photorealistic.
 
-            # Manual command
-            if custom_channel is not None:
-                channel = custom_channel
+Leave the wooden board and the pinned calendar blank, in place and
+unobstructed; the countdown is drawn onto them afterwards.
+No numbers, letters, words, signs or progress bars anywhere in the image.
 
-            # Scheduled cron send
-            else:
-                channel = await self.bot.fetch_channel(
-                    self.channel_id
-                )
+Professional luxury travel campaign.
+Photorealistic.
 
-        except Exception as e:
-            print(
-                f"Channel error: {e}"
-            )
-            return
+HARD RULE:
+Do not alter the man's face or identity.
+"""
 
+    def scene_cache_key(
+        self,
+        days_left,
+        template_digest
+    ):
+        """Hash of everything that affects the day's scene; not the dates or fact."""
 
-        now = datetime.now(
-            self.timezone
+        return cache_key(
+            "scene",
+            IMAGE_MODEL,
+            self.build_scene_prompt(
+                days_left
+            ),
+            template_digest,
+            TEMPLATE_MAX_SIDE,
+            sorted(
+                self.image_options.items()
+            )
         )
 
-        today = now.date()
-
-        days_left = (
-            self.holiday_date
-            - today
-        ).days
-
-        if days_left < 0:
-            return
+    @property
+    def composes_board(self):
+        """Whether the day's board is drawn locally over a cached scene.
 
-        days_passed = (
-            today
-            - self.start_date
-        ).days
+        Without Pillow nothing can be drawn, so hybrid falls back to
+        the full API render instead of paying for a scene it can't use.
+        """
 
-        progress_percent = round(
-            (
-                days_passed
-                / self.total_days
-            )
-            * 100
+        return (
+            self.render_mode == "hybrid"
+            and has_pil()
         )
 
-        fact = COUNTDOWN_FACTS.get(
-            days_left,
-            "Kiekviena diena priartina prie Malagos."
-        )
+    def image_cache_key(
+        self,
+        days_left,
+        progress_percent,
+        fact,
+        template_digest
+    ):
+        """Hash of everything that affects the day's image.
+
+        ``template_digest`` comes from ``current_template_digest``, so
+        the template is never stat'ed or hashed on the event loop.
+        """
+
+        if self.composes_board:
+            return cache_key(
+                "board",
+                self.scene_cache_key(
+                    days_left,
+                    template_digest
+                ),
+                BOARD_TITLE,
+                BOARD_BOX,
+                CALENDAR_BOX,
+                days_left,
+                self.lithuanian_days(
+                    days_left
+                ),
+                progress_percent,
+                fact
+            )
 
-        image_bytes = await (
-            self.generate_countdown_image(
+        return cache_key(
+            IMAGE_MODEL,
+            self.build_prompt(
                 days_left,
                 progress_percent,
                 fact
+            ),
+            template_digest,
+            TEMPLATE_MAX_SIDE,
+            sorted(
+                self.image_options.items()
             )
         )
 
-        if not image_bytes:
-            return
+    async def current_template_digest(self):
+        """Digest of the template file, checked in a thread."""
 
-        file = discord.File(
-            BytesIO(
-                image_bytes
-            ),
-            filename="malaga.png"
+        return await asyncio.to_thread(
+            self.template_digest.get
         )
 
-        embed = discord.Embed(
+    async def load_template(self):
+        """Returns the downscaled template, preparing it once per file version."""
+
+        digest = await self.current_template_digest()
+
+        if (
+            self._template_upload is None
+            or self._template_upload[0] != digest
+        ):
+            upload = await asyncio.to_thread(
+                prepare_reference_image,
+                self.template_path,
+                TEMPLATE_MAX_SIDE
+            )
+
+            self._template_upload = (
+                digest,
+                upload
+            )
+
+        return self._template_upload[1]
+
+    async def generate_countdown_image(
+        self,
+        days_left,
+        progress_percent,
+        fact
+    ):
+        """Returns the path of the cached image, generating it if needed.
+
+        Callers asking for the same image while it is being generated
+        (the command, the scheduled send, the prefetch) wait for that one
+        generation instead of paying for their own.
+        """
+
+        key = self.image_cache_key(
+            days_left,
+            progress_percent,
+            fact,
+            await self.current_template_digest()
+        )
+
+        cached = await self.image_cache.lookup(
+            key
+        )
+
+        self.metrics.inc(
+            "image_cache_total",
+            result="miss" if cached is None else "hit"
+        )
+
+        if cached is not None:
+            return cached
+
+        if self.composes_board:
+            generate = self._compose_countdown_image
+        else:
+            generate = self._generate_countdown_image
+
+        return await self._generations.do(
+            key,
+            functools.partial(
+                generate,
+                key,
+                days_left,
+                progress_percent,
+                fact
+            )
+        )
+
+    async def _generate_countdown_image(
+        self,
+        key,
+        days_left,
+        progress_percent,
+        fact
+    ):
+        return await self._edit_into_cache(
+            key,
+            self.build_prompt(
+                days_left,
+                progress_percent,
+                fact
+            ),
+            meta={
+                "days_left": days_left,
+                "progress_percent": progress_percent,
+            }
+        )
+
+    async def scene_image(
+        self,
+        days_left
+    ):
+        """Returns the path of the day's cached scene, generating it once."""
+
+        key = self.scene_cache_key(
+            days_left,
+            await self.current_template_digest()
+        )
+
+        cached = await self.image_cache.lookup(
+            key
+        )
+
+        self.metrics.inc(
+            "scene_cache_total",
+            result="miss" if cached is None else "hit"
+        )
+
+        if cached is not None:
+            return cached
+
+        return await self._generations.do(
+            key,
+            functools.partial(
+                self._edit_into_cache,
+                key,
+                self.build_scene_prompt(
+                    days_left
+                ),
+                meta={
+                    "scene": COUNTDOWN_ACTIVITIES.get(
+                        days_left,
+                        "relaxing"
+                    ),
+                }
+            )
+        )
+
+    async def _compose_countdown_image(
+        self,
+        key,
+        days_left,
+        progress_percent,
+        fact
+    ):
+        scene_path = await self.scene_image(
+            days_left
+        )
+
+        if scene_path is None:
+            return None
+
+        tmp_path = self.image_cache.temp_path_for(
+            key
+        )
+
+        try:
+            with self.metrics.stage("compose"):
+                rendered = await asyncio.to_thread(
+                    render_board,
+                    scene_path,
+                    tmp_path,
+                    BOARD_TITLE,
+                    days_left,
+                    (
+                        f"{self.lithuanian_days(days_left)} "
+                        "iki kelionės"
+                    ),
+                    fact,
+                    progress_percent,
+                    board=BOARD_BOX,
+                    calendar=CALENDAR_BOX
+                )
+
+            if rendered:
+                return await self.image_cache.store(
+                    key,
+                    tmp_path,
+                    meta={
+                        "days_left": days_left,
+                        "progress_percent": progress_percent,
+                    },
+                    extension=upload_format()[1]
+                )
+
+        except Exception as e:
+            print(
+                f"Compose error: {e}"
+            )
+
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        return None
+
+    async def _edit_into_cache(
+        self,
+        key,
+        prompt,
+        meta
+    ):
+        # A previous flight may have filled the cache
+        # between the check and this run.
+        cached = await self.image_cache.lookup(
+            key
+        )
+
+        if cached is not None:
+            return cached
+
+        tmp_path = self.image_cache.temp_path_for(
+            key
+        )
+
+        options = dict(
+            self.image_options
+        )
+
+        try:
+            template = await self.load_template()
+
+            # Decoded straight from the response stream to disk.
+            written = await self.images.edit_to_file(
+                tmp_path,
+                model=IMAGE_MODEL,
+                image=template,
+                prompt=prompt,
+                **options
+            )
+
+            if written:
+                with self.metrics.stage("cache_write"):
+                    return await self.image_cache.store(
+                        key,
+                        tmp_path,
+                        meta=meta,
+                        extension=FORMAT_EXTENSIONS[
+                            options["output_format"]
+                        ]
+                    )
+
+        except Exception as e:
+            print(
+                f"Generation error: {e}"
+            )
+
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        return None
+
+    async def build_countdown_post(
+        self,
+        day
+    ):
+        """Returns the upload path of the countdown image for a day, or None.
+
+        If the generated image isn't ready within POST_DEADLINE (or can't
+        be generated at all) the countdown is drawn on the template
+        locally, so the post still goes out on time.
+        """
+
+        (
+            days_left,
+            progress_percent,
+            fact
+        ) = self.countdown_for_date(
+            day
+        )
+
+        if days_left < 0:
+            return None
+
+        image_path = None
+
+        if self.images.has_key:
+            try:
+                # Only this wait is cut short; a generation in flight
+                # keeps going and fills the cache for later.
+                image_path = await asyncio.wait_for(
+                    self.generate_countdown_image(
+                        days_left,
+                        progress_percent,
+                        fact
+                    ),
+                    POST_DEADLINE
+                )
+
+            except asyncio.TimeoutError:
+                print(
+                    f"Countdown image for day {days_left} not ready in time"
+                )
+
+        if not image_path:
+            self.metrics.inc(
+                "fallback_total"
+            )
+
+            image_path = await self.render_fallback_image(
+                days_left,
+                progress_percent,
+                fact
+            )
+
+        if not image_path:
+            return None
+
+        return await self.upload_variant(
+            image_path
+        )
+
+    async def render_fallback_image(
+        self,
+        days_left,
+        progress_percent,
+        fact
+    ):
+        """Draws the countdown over the template locally; no API call."""
+
+        key = cache_key(
+            "fallback",
+            days_left,
+            progress_percent,
+            fact,
+            await self.current_template_digest()
+        )
+
+        cached = await self.image_cache.lookup(
+            key
+        )
+
+        if cached is not None:
+            return cached
+
+        tmp_path = self.image_cache.temp_path_for(
+            key
+        )
+
+        try:
+            with self.metrics.stage("fallback_render"):
+                rendered = await asyncio.to_thread(
+                    render_text_card,
+                    self.template_path,
+                    tmp_path,
+                    (
+                        f"{days_left} "
+                        f"{self.lithuanian_days(days_left)} "
+                        "iki kelionės"
+                    ),
+                    fact,
+                    progress_percent
+                )
+
+            if rendered:
+                return await self.image_cache.store(
+                    key,
+                    tmp_path,
+                    meta={
+                        "days_left": days_left,
+                        "fallback": True,
+                    },
+                    extension=upload_format()[1]
+                )
+
+        except Exception as e:
+            print(
+                f"Fallback render error: {e}"
+            )
+
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        return None
+
+    async def cdn_url(
+        self,
+        key
+    ):
+        """Valid CDN URL of an earlier upload, refreshed if it expired."""
+
+        url = self.attachments.url(
+            key
+        )
+
+        if url is not None:
+            return url
+
+        entry = self.attachments.entry(
+            key
+        )
+
+        if entry is None:
+            return None
+
+        # Fetching the message again returns freshly signed links.
+        channel = await self.delivery.channel(
+            entry["channel_id"]
+        )
+
+        if channel is None:
+            self.attachments.forget(
+                key
+            )
+
+            return None
+
+        try:
+            message = await channel.fetch_message(
+                entry["message_id"]
+            )
+
+        except discord.HTTPException:
+            self.attachments.forget(
+                key
+            )
+
+            return None
+
+        self.metrics.inc(
+            "cdn_refresh_total"
+        )
+
+        return self.attachments.remember(
+            key,
+            message
+        )
+
+    async def send_countdown(
+        self,
+        channel,
+        upload_path,
+        reuse=False
+    ):
+        """Posts the countdown image to a channel.
+
+        With ``reuse`` an image already uploaded to this channel is linked
+        by its CDN URL instead of being uploaded again. Only for repeat
+        command calls: a linked embed breaks once the signed URL expires.
+        """
+
+        embed = discord.Embed(
             description=(
                 "☀️ Kasdien vis arčiau "
                 "atostogų."
@@ -454,13 +1337,343 @@ Do not alter the man's face or identity.
             color=discord.Color.orange()
         )
 
+        stat = await asyncio.to_thread(
+            os.stat,
+            upload_path
+        )
+
+        key = (
+            channel.id,
+            upload_path,
+            stat.st_mtime_ns
+        )
+
+        if not reuse:
+            return await self.upload_countdown(
+                channel,
+                embed,
+                upload_path,
+                key
+            )
+
+        url = await self.cdn_url(
+            key
+        )
+
+        if url is None:
+            # Concurrent commands wait for the first upload
+            # and then link to it.
+            async with self._upload_lock:
+                url = await self.cdn_url(
+                    key
+                )
+
+                if url is None:
+                    return await self.upload_countdown(
+                        channel,
+                        embed,
+                        upload_path,
+                        key
+                    )
+
+        self.metrics.inc(
+            "cdn_reuse_total"
+        )
+
+        embed.set_image(
+            url=url
+        )
+
+        return await channel.send(
+            embed=embed
+        )
+
+    async def upload_countdown(
+        self,
+        channel,
+        embed,
+        upload_path,
+        key
+    ):
+        filename = "malaga" + os.path.splitext(
+            upload_path
+        )[1]
+
+        # Served from the memory tier when the image was posted recently.
+        data = await self.image_cache.read(
+            upload_path
+        )
+
+        file = discord.File(
+            io.BytesIO(data),
+            filename=filename
+        )
+
         embed.set_image(
-            url="attachment://malaga.png"
+            url=f"attachment://{filename}"
+        )
+
+        with self.metrics.stage("upload"):
+            message = await channel.send(
+                embed=embed,
+                file=file
+            )
+
+        self.metrics.inc(
+            "uploaded_bytes_total",
+            len(data)
         )
 
-        await channel.send(
-            embed=embed,
-            file=file
+        self.attachments.remember(
+            key,
+            message
+        )
+
+        return message
+
+    async def upload_variant(
+        self,
+        image_path
+    ):
+        """Compressed copy of a cached image that fits the upload budget."""
+
+        try:
+            with self.metrics.stage("compress"):
+                return await asyncio.to_thread(
+                    compress_for_upload,
+                    image_path,
+                    self.upload_max_bytes
+                )
+
+        except Exception as e:
+            print(
+                f"Compression error: {e}"
+            )
+
+            return image_path
+
+    async def warm_countdown_image(
+        self,
+        day
+    ):
+        """Loads the day's upload into the memory tier if it's already generated."""
+
+        (
+            days_left,
+            progress_percent,
+            fact
+        ) = self.countdown_for_date(
+            day
+        )
+
+        if days_left < 0:
+            return
+
+        image_path = await self.image_cache.lookup(
+            self.image_cache_key(
+                days_left,
+                progress_percent,
+                fact,
+                await self.current_template_digest()
+            )
+        )
+
+        if image_path is None:
+            return
+
+        await self.image_cache.read(
+            await self.upload_variant(
+                image_path
+            )
+        )
+
+    async def export_metrics(self):
+        if not self.metrics_export_path:
+            return
+
+        try:
+            await asyncio.to_thread(
+                self.metrics.export,
+                self.metrics_export_path
+            )
+
+        except OSError as e:
+            print(
+                f"Metrics export error: {e}"
+            )
+
+    def schedule_prefetch(
+        self,
+        days=None
+    ):
+        """Starts the background prefetch unless one is already running."""
+
+        if (
+            self.prefetch_task is None
+            or self.prefetch_task.done()
+        ):
+            self.prefetch_task = self.scheduler.spawn(
+                self.prefetch_countdown_images(
+                    days
+                ),
+                name="countdown-prefetch"
+            )
+
+        return self.prefetch_task
+
+    async def _wait_for_rate_budget(self):
+        loop = asyncio.get_running_loop()
+
+        async with self._rate_lock:
+            delay = (
+                self._next_request_at
+                - loop.time()
+            )
+
+            if delay > 0:
+                await asyncio.sleep(
+                    delay
+                )
+
+            self._next_request_at = (
+                loop.time()
+                + self.prefetch_interval
+            )
+
+    async def _prefetch_day(
+        self,
+        semaphore,
+        day
+    ):
+        (
+            days_left,
+            progress_percent,
+            fact
+        ) = self.countdown_for_date(
+            day
+        )
+
+        for attempt in range(
+            PREFETCH_ATTEMPTS
+        ):
+            async with semaphore:
+                # Composing over an already cached scene makes no API call.
+                if (
+                    not self.composes_board
+                    or await self.image_cache.lookup(
+                        self.scene_cache_key(
+                            days_left,
+                            await self.current_template_digest()
+                        )
+                    ) is None
+                ):
+                    await self._wait_for_rate_budget()
+
+                image_path = await (
+                    self.generate_countdown_image(
+                        days_left,
+                        progress_percent,
+                        fact
+                    )
+                )
+
+            if image_path:
+                await self.upload_variant(
+                    image_path
+                )
+
+                return True
+
+            if attempt + 1 == PREFETCH_ATTEMPTS:
+                break
+
+            self.metrics.inc(
+                "prefetch_retries_total"
+            )
+
+            await asyncio.sleep(
+                2 ** attempt
+                * self.prefetch_interval
+            )
+
+        print(
+            f"Prefetch failed for day {days_left}"
+        )
+
+        return False
+
+    async def prefetch_countdown_images(
+        self,
+        days=None
+    ):
+        """Renders the next days' images into the cache ahead of time.
+
+        Returns (generated, failed) counts.
+        """
+
+        if not self.images.has_key:
+            return 0, 0
+
+        if days is None:
+            days = self.prefetch_days
+
+        today = datetime.now(
+            self.timezone
+        ).date()
+
+        first_day = max(
+            today,
+            self.start_date
+        )
+
+        last_day = min(
+            today + timedelta(days=days),
+            self.holiday_date
+        )
+
+        pending = []
+        day = first_day
+        template_digest = await self.current_template_digest()
+
+        while day <= last_day:
+            key = self.image_cache_key(
+                *self.countdown_for_date(
+                    day
+                ),
+                template_digest
+            )
+
+            if await self.image_cache.lookup(
+                key
+            ) is None:
+                pending.append(day)
+
+            day += timedelta(days=1)
+
+        if not pending:
+            return 0, 0
+
+        semaphore = asyncio.Semaphore(
+            self.prefetch_concurrency
+        )
+
+        results = await asyncio.gather(
+            *(
+                self._prefetch_day(
+                    semaphore,
+                    day
+                )
+                for day in pending
+            )
+        )
+
+        generated = sum(results)
+
+        await self.export_metrics()
+
+        return (
+            generated,
+            len(results) - generated
         )
 
     @commands.command()
@@ -470,18 +1683,258 @@ Do not alter the man's face or identity.
     ):
         """Parodo countdown."""
 
-        await self.send_countdown(
-            custom_channel=ctx.channel
+        post = await self.build_countdown_post(
+            datetime.now(
+                self.timezone
+            ).date()
         )
 
+        if post is not None:
+            await self.send_countdown(
+                ctx.channel,
+                post,
+                reuse=True
+            )
+
     @commands.command()
+    @commands.is_owner()
+    async def prefetchcountdown(
+        self,
+        ctx,
+        days: int = PREFETCH_DAYS,
+        concurrency: int = PREFETCH_CONCURRENCY
+    ):
+        """Iš anksto sugeneruoja ateinančių dienų paveikslėlius."""
+
+        if days < 1 or concurrency < 1:
+            await ctx.send(
+                "Neteisingi parametrai."
+            )
+
+            return
+
+        # schedule_prefetch would hand back the running job, which ignores
+        # these parameters; say so instead of reporting its counts.
+        if (
+            self.prefetch_task is not None
+            and not self.prefetch_task.done()
+        ):
+            await ctx.send(
+                (
+                    "⏳ Paveikslėliai jau generuojami. "
+                    "Pabandyk vėliau."
+                )
+            )
+
+            return
+
+        self.prefetch_days = days
+        self.prefetch_concurrency = concurrency
+
+        await self.config.prefetch_days.set(
+            days
+        )
+        await self.config.prefetch_concurrency.set(
+            concurrency
+        )
+
+        await ctx.send(
+            (
+                "⏳ Generuojami "
+                f"{days} dienų paveikslėliai..."
+            )
+        )
+
+        generated, failed = await (
+            self.schedule_prefetch(
+                days
+            )
+        )
+
+        await ctx.send(
+            (
+                "✅ Sugeneruota: "
+                f"{generated}, nepavyko: {failed}."
+            )
+        )
+
+    @commands.command()
+    @commands.is_owner()
+    async def countdownstats(
+        self,
+        ctx
+    ):
+        """Rodo paskutinių generavimų ir siuntimų p50/p95 laikus bei skaitiklius."""
+
+        await ctx.send(
+            box(
+                format_summary(
+                    self.metrics
+                )
+            )
+        )
+
+        await self.export_metrics()
+
+    @commands.command()
+    @commands.is_owner()
+    async def setcountdownmetrics(
+        self,
+        ctx,
+        path: str = None
+    ):
+        """Po kiekvieno siuntimo įrašo metrikas į failą (.json arba Prometheus tekstas).
+
+        Be kelio eksportas išjungiamas.
+        """
+
+        self.metrics_export_path = path
+
+        await self.config.metrics_export_path.set(
+            path
+        )
+
+        if path is None:
+            await ctx.send(
+                "📉 Metrikų eksportas išjungtas."
+            )
+
+            return
+
+        await self.export_metrics()
+
+        await ctx.send(
+            f"📈 Metrikos rašomos į `{path}`."
+        )
+
+    @commands.command()
+    @commands.is_owner()
+    async def setcountdownuploadlimit(
+        self,
+        ctx,
+        kilobytes: int
+    ):
+        """Nustato didžiausią įkeliamo paveikslėlio dydį (KB)."""
+
+        if kilobytes < 100:
+            await ctx.send(
+                "Per mažas dydis."
+            )
+
+            return
+
+        self.upload_max_bytes = kilobytes * 1024
+        # Variants for the old budget won't be uploaded again.
+        self.image_cache.hot.clear()
+
+        await self.config.upload_max_bytes.set(
+            self.upload_max_bytes
+        )
+
+        await ctx.send(
+            (
+                "📦 Paveikslėlių dydis "
+                f"ribojamas iki {kilobytes} KB."
+            )
+        )
+
+    @commands.command()
+    @commands.is_owner()
+    async def setcountdownimage(
+        self,
+        ctx,
+        size: str,
+        quality: str,
+        output_format: str,
+        compression: int = 85
+    ):
+        """Nustato generuojamo paveikslėlio dydį, kokybę ir formatą."""
+
+        output_format = output_format.lower()
+
+        if (
+            size not in IMAGE_SIZES
+            or quality not in IMAGE_QUALITIES
+            or output_format not in IMAGE_FORMATS
+            or not 0 <= compression <= 100
+        ):
+            await ctx.send(
+                (
+                    "Neteisingi parametrai. Dydžiai: "
+                    f"{', '.join(IMAGE_SIZES)}; kokybė: "
+                    f"{', '.join(IMAGE_QUALITIES)}; formatai: "
+                    f"{', '.join(IMAGE_FORMATS)}."
+                )
+            )
+
+            return
+
+        self.image_options = {
+            "size": size,
+            "quality": quality,
+            "output_format": output_format,
+        }
+
+        if output_format != "png":
+            self.image_options[
+                "output_compression"
+            ] = compression
+
+        await self.config.image_options.set(
+            self.image_options
+        )
+
+        await ctx.send(
+            (
+                "🖼️ Paveikslėliai: "
+                f"{size}, {quality}, {output_format}."
+            )
+        )
+
+    @commands.command()
+    @commands.is_owner()
+    async def setcountdownrender(
+        self,
+        ctx,
+        mode: str
+    ):
+        """Nustato piešimo režimą: hybrid (scena kartą, lenta vietoje) arba full."""
+
+        mode = mode.lower()
+
+        if mode not in RENDER_MODES:
+            await ctx.send(
+                (
+                    "Neteisingas režimas. Galimi: "
+                    f"{', '.join(RENDER_MODES)}."
+                )
+            )
+
+            return
+
+        self.render_mode = mode
+
+        await self.config.render_mode.set(
+            mode
+        )
+
+        await ctx.send(
+            f"🎨 Piešimo režimas: {mode}."
+        )
+
+        # Have the upcoming days ready in the new mode.
+        self.schedule_prefetch()
+
+    @commands.command()
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
     async def setcountdowntime(
         self,
         ctx,
         hour: int,
         minute: int
     ):
-        """Nustato countdown laiką."""
+        """Nustato countdown laiką šiame serveryje."""
 
         if not (
             0 <= hour <= 23 and
@@ -493,11 +1946,14 @@ Do not alter the man's face or identity.
 
             return
 
-        self.set_cron_job(
-            hour,
-            minute
+        guild_config = self.config.guild(
+            ctx.guild
         )
 
+        await guild_config.hour.set(hour)
+        await guild_config.minute.set(minute)
+        await self.refresh_schedule()
+
         await ctx.send(
             (
                 "⏰ Countdown laikas "
@@ -505,6 +1961,49 @@ Do not alter the man's face or identity.
                 f"{hour:02}:{minute:02}"
             )
         )
+
+    @commands.command()
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    async def setcountdownchannel(
+        self,
+        ctx,
+        channel: discord.TextChannel
+    ):
+        """Nustato countdown kanalą šiame serveryje."""
+
+        await self.config.guild(
+            ctx.guild
+        ).channel_id.set(
+            channel.id
+        )
+        await self.refresh_schedule()
+
+        await ctx.send(
+            (
+                "📢 Countdown kanalas "
+                f"nustatytas į {channel.mention}"
+            )
+        )
+
+    @commands.command()
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    async def removecountdownchannel(
+        self,
+        ctx
+    ):
+        """Išjungia countdown šiame serveryje."""
+
+        await self.config.guild(
+            ctx.guild
+        ).channel_id.set(None)
+        await self.refresh_schedule()
+
+        await ctx.send(
+            "🔕 Countdown šiame serveryje išjungtas."
+        )
+
     def load_api_key(self):
         if os.path.exists(API_KEY_FILE):
             with open(
@@ -518,8 +2017,8 @@ Do not alter the man's face or identity.
                 )
 
                 if self.api_key:
-                    self.client = OpenAI(
-                        api_key=self.api_key
+                    self.images.set_api_key(
+                        self.api_key
                     )
 
     def save_api_key(
@@ -545,8 +2044,10 @@ Do not alter the man's face or identity.
             api_key
         )
 
-        self.client = OpenAI(
-            api_key=api_key
+        # Rotates the key without dropping requests already in flight
+        self.api_key = api_key
+        self.images.set_api_key(
+            api_key
         )
 
         await ctx.send(
@@ -0,0 +1,484 @@
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+# Bytes of file contents kept in the in-memory tier.
+HOT_TIER_BYTES = 32 * 1024 * 1024
+
+
+def cache_key(*parts):
+    """Stable hash of every input that affects a generated image."""
+
+    hasher = hashlib.sha256()
+
+    for part in parts:
+        encoded = str(part).encode(
+            "utf-8"
+        )
+
+        # Length-prefix each part so ("ab", "c") != ("a", "bc").
+        hasher.update(
+            f"{len(encoded)}:".encode("ascii")
+        )
+        hasher.update(encoded)
+
+    return hasher.hexdigest()
+
+
+class FileDigest:
+    """sha256 of a file, recomputed only when its size or mtime changes.
+
+    With ``max_age`` the file is stat'ed at most that often (seconds), so
+    repeated calls are answered from memory.
+    """
+
+    def __init__(
+        self,
+        path,
+        max_age=0
+    ):
+        self.path = path
+        self.max_age = max_age
+        self._signature = None
+        self._digest = None
+        self._checked_at = None
+
+    def get(self):
+        now = time.monotonic()
+
+        if (
+            self._digest is not None
+            and now - self._checked_at < self.max_age
+        ):
+            return self._digest
+
+        self._checked_at = now
+
+        stat = os.stat(
+            self.path
+        )
+
+        signature = (
+            stat.st_size,
+            stat.st_mtime_ns
+        )
+
+        if signature != self._signature:
+            hasher = hashlib.sha256()
+
+            with open(
+                self.path,
+                "rb"
+            ) as f:
+                for chunk in iter(
+                    lambda: f.read(1 << 20),
+                    b""
+                ):
+                    hasher.update(chunk)
+
+            self._digest = hasher.hexdigest()
+            self._signature = signature
+
+        return self._digest
+
+
+class MemoryTier:
+    """Size-bounded LRU of file contents, keyed by path.
+
+    Entries are trusted until ``forget``/``clear``; whoever replaces a
+    file in place must drop it here.
+    """
+
+    def __init__(
+        self,
+        max_bytes
+    ):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total = 0
+        # Used from the event loop and from cache worker threads.
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        path
+    ):
+        with self._lock:
+            data = self.entries.get(path)
+
+            if data is not None:
+                self.entries.move_to_end(path)
+
+            return data
+
+    def put(
+        self,
+        path,
+        data
+    ):
+        # Don't let one large file flush everything else.
+        if len(data) > self.max_bytes // 4:
+            return
+
+        with self._lock:
+            self._drop(path)
+            self.entries[path] = data
+            self.total += len(data)
+
+            while self.total > self.max_bytes:
+                _, dropped = self.entries.popitem(
+                    last=False
+                )
+                self.total -= len(dropped)
+
+    def _drop(
+        self,
+        path
+    ):
+        data = self.entries.pop(
+            path,
+            None
+        )
+
+        if data is not None:
+            self.total -= len(data)
+
+    def forget(
+        self,
+        prefix
+    ):
+        """Drops ``prefix`` and every cached path starting with it."""
+
+        with self._lock:
+            for path in [
+                path for path in self.entries
+                if path.startswith(prefix)
+            ]:
+                self._drop(path)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.total = 0
+
+
+class ImageCache:
+    """Content-addressed image cache with a size-bounded LRU policy.
+
+    Entries live in ``directory`` as ``<key><ext>`` and are tracked in
+    ``manifest.json`` together with their size, last use time and a bit of
+    free-form metadata. When the total size goes over ``max_bytes`` the
+    least recently used entries are evicted.
+
+    The plain methods do blocking file I/O; the async ones (``load``,
+    ``lookup``, ``store``, ``read``, ``flush``) run it in a thread.
+    ``read`` serves recently used files from an in-memory tier of
+    ``memory_bytes``, so hot reads never touch the disk.
+    """
+
+    def __init__(
+        self,
+        directory,
+        max_bytes,
+        memory_bytes=HOT_TIER_BYTES
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(
+            directory,
+            "manifest.json"
+        )
+        self._manifest = None
+        # Last-use updates are saved with the next write or ``flush``.
+        self._dirty = False
+        self._lock = threading.RLock()
+        self.hot = MemoryTier(
+            memory_bytes
+        )
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            try:
+                with open(
+                    self.manifest_path,
+                    "r",
+                    encoding="utf-8"
+                ) as f:
+                    self._manifest = json.load(f)
+
+            except (OSError, ValueError):
+                self._manifest = {}
+
+        return self._manifest
+
+    def _save_manifest(self):
+        os.makedirs(
+            self.directory,
+            exist_ok=True
+        )
+
+        self._dirty = False
+
+        tmp_path = f"{self.manifest_path}.tmp"
+
+        with open(
+            tmp_path,
+            "w",
+            encoding="utf-8"
+        ) as f:
+            json.dump(
+                self.manifest,
+                f,
+                indent=1
+            )
+
+        os.replace(
+            tmp_path,
+            self.manifest_path
+        )
+
+    def path_for(
+        self,
+        key,
+        extension=None
+    ):
+        if extension is None:
+            extension = self.manifest.get(
+                key,
+                {}
+            ).get(
+                "ext",
+                ".png"
+            )
+
+        return os.path.join(
+            self.directory,
+            f"{key}{extension}"
+        )
+
+    def get_path(
+        self,
+        key
+    ):
+        """Returns the path of the cached file for ``key`` or ``None``.
+
+        Marks the entry as recently used. Callers stream from the file
+        instead of loading it into memory.
+        """
+
+        with self._lock:
+            if key not in self.manifest:
+                return None
+
+            path = self.path_for(key)
+
+            if not os.path.exists(path):
+                del self.manifest[key]
+                self._save_manifest()
+                return None
+
+            self.manifest[key]["last_used"] = time.time()
+            self._dirty = True
+
+            return path
+
+    def temp_path_for(
+        self,
+        key
+    ):
+        """Scratch path to write a new entry to before ``put_file``.
+
+        The directory is created by ``load``.
+        """
+
+        return os.path.join(
+            self.directory,
+            f"{key}.tmp"
+        )
+
+    def put_file(
+        self,
+        key,
+        tmp_path,
+        meta=None,
+        extension=".png"
+    ):
+        """Atomically moves a fully written file into the cache."""
+
+        with self._lock:
+            path = self.path_for(
+                key,
+                extension
+            )
+
+            os.replace(
+                tmp_path,
+                path
+            )
+
+            self.hot.forget(
+                os.path.join(
+                    self.directory,
+                    key
+                )
+            )
+
+            self.manifest[key] = {
+                "ext": extension,
+                "size": os.path.getsize(path),
+                "last_used": time.time(),
+                "meta": meta or {},
+            }
+
+            self.evict()
+            self._save_manifest()
+
+            return path
+
+    def total_bytes(self):
+        return sum(
+            entry["size"]
+            for entry in self.manifest.values()
+        )
+
+    def evict(self):
+        """Drops least recently used entries until under ``max_bytes``."""
+
+        total = self.total_bytes()
+
+        if total <= self.max_bytes:
+            return
+
+        by_age = sorted(
+            self.manifest.items(),
+            key=lambda item: item[1]["last_used"]
+        )
+
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+
+            self.hot.forget(
+                os.path.join(
+                    self.directory,
+                    key
+                )
+            )
+
+            # The image plus any derived variants stored next to it.
+            for path in glob.glob(
+                os.path.join(
+                    self.directory,
+                    f"{key}.*"
+                )
+            ):
+                try:
+                    os.remove(path)
+
+                except FileNotFoundError:
+                    pass
+
+            del self.manifest[key]
+            total -= entry["size"]
+
+    async def load(self):
+        """Creates the directory and reads the manifest off the event loop."""
+
+        def _load():
+            os.makedirs(
+                self.directory,
+                exist_ok=True
+            )
+
+            return len(self.manifest)
+
+        return await asyncio.to_thread(
+            _load
+        )
+
+    async def lookup(
+        self,
+        key
+    ):
+        """Async ``get_path``; answered from memory for hot entries."""
+
+        manifest = self._manifest
+
+        if manifest is not None and key in manifest:
+            path = self.path_for(key)
+
+            if self.hot.get(path) is not None:
+                manifest[key]["last_used"] = time.time()
+                self._dirty = True
+
+                return path
+
+        return await asyncio.to_thread(
+            self.get_path,
+            key
+        )
+
+    async def store(
+        self,
+        key,
+        tmp_path,
+        meta=None,
+        extension=".png"
+    ):
+        return await asyncio.to_thread(
+            self.put_file,
+            key,
+            tmp_path,
+            meta,
+            extension
+        )
+
+    async def read(
+        self,
+        path
+    ):
+        """Contents of ``path`` (in or outside the cache), kept in the memory tier."""
+
+        data = self.hot.get(path)
+
+        if data is None:
+            data = await asyncio.to_thread(
+                _read_file,
+                path
+            )
+
+            self.hot.put(
+                path,
+                data
+            )
+
+        return data
+
+    async def flush(self):
+        """Saves pending last-use updates."""
+
+        if self._dirty:
+            def _flush():
+                with self._lock:
+                    self._save_manifest()
+
+            await asyncio.to_thread(
+                _flush
+            )
+
+
+def _read_file(
+    path
+):
+    with open(
+        path,
+        "rb"
+    ) as f:
+        return f.read()
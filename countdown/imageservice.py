@@ -0,0 +1,303 @@
+import asyncio
+import base64
+import contextlib
+import random
+import threading
+import time
+
+
+# Connection pool shared by every request the service makes.
+MAX_CONNECTIONS = 10
+MAX_KEEPALIVE_CONNECTIONS = 5
+REQUEST_TIMEOUT = 300
+# Default total budget (seconds) of one streamed request, retries included.
+REQUEST_DEADLINE = 300
+# Attempts per streamed request; waits between them grow exponentially with full jitter.
+RETRY_ATTEMPTS = 4
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 30
+# HTTP statuses worth retrying.
+RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+# Consecutive transient failures that open the circuit, and how long it stays open.
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 300
+# Size of the response chunks decoded at a time when streaming images to disk.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+B64_JSON_KEY = b'"b64_json"'
+
+
+class B64JsonDecoder:
+    """Incrementally decodes the first ``b64_json`` value of a JSON body.
+
+    Feed it raw response chunks; decoded image bytes are written to ``out``
+    as they arrive, so neither the JSON text nor the decoded image is ever
+    held in memory as a whole.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.state = "key"
+        self.buffer = b""
+        self.pending = b""
+
+    @property
+    def done(self):
+        return self.state == "done"
+
+    def feed(self, chunk):
+        if self.state == "key":
+            self.buffer += chunk
+            index = self.buffer.find(B64_JSON_KEY)
+            if index < 0:
+                # Keep enough of the tail to match a key split across chunks.
+                self.buffer = self.buffer[-len(B64_JSON_KEY):]
+                return
+            chunk = self.buffer[index + len(B64_JSON_KEY):]
+            self.buffer = b""
+            self.state = "value"
+
+        if self.state == "value":
+            self.buffer += chunk
+            index = self.buffer.find(b'"')
+            if index < 0:
+                return
+            chunk = self.buffer[index + 1:]
+            self.buffer = b""
+            self.state = "data"
+
+        if self.state == "data":
+            end = chunk.find(b'"')
+            data = self.pending + (chunk if end < 0 else chunk[:end]).replace(b"\\", b"")
+            usable = len(data) - len(data) % 4
+            if usable:
+                self.out.write(base64.b64decode(data[:usable]))
+            self.pending = data[usable:]
+            if end >= 0:
+                self.state = "done"
+
+    def close(self):
+        if self.pending:
+            padded = self.pending + b"=" * (-len(self.pending) % 4)
+            self.out.write(base64.b64decode(padded))
+            self.pending = b""
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stops calling a failing service for a while.
+
+    After ``threshold`` consecutive failures the circuit opens and ``allow``
+    returns ``False`` for ``cooldown`` seconds. Then calls go through
+    again; one success closes the circuit, one more failure re-opens it.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.cooldown
+
+    def allow(self):
+        return not self.is_open
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+def is_transient(error):
+    """Whether a failed request is worth retrying (timeouts, connection errors, 429/5xx)."""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRY_STATUSES
+    # openai's connection and timeout errors carry no status.
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class ImageService:
+    """Async OpenAI image client with a single pooled HTTP session.
+
+    Every call goes through one ``httpx.AsyncClient``; rotating the API key
+    swaps only the lightweight ``AsyncOpenAI`` wrapper on top of that pool,
+    so requests already in flight finish with the old key and nothing is
+    torn down under them. ``openai`` and ``httpx`` are only imported, and
+    the clients only built, when first needed, in a worker thread
+    (``ensure_client``; call it from a warm-up task to have it done before
+    the first request). Call ``close`` from ``cog_unload``.
+
+    Streamed requests run under a deadline and are retried on transient
+    errors with exponential backoff and jitter; repeated failures open a
+    circuit breaker so callers fall back quickly instead of waiting on a
+    service that is down.
+
+    With ``metrics`` set, every streamed request is timed (``generate``
+    for the whole call, ``decode`` for reading the body to disk) and API
+    errors are counted by class and HTTP status.
+    """
+
+    def __init__(self, api_key=None, metrics=None):
+        self.metrics = metrics
+        self.breaker = CircuitBreaker()
+        self._http_client = None
+        self._client = None
+        self._api_key = None
+        self._closed = False
+        # Clients may be built from a worker thread (``ensure_client``).
+        self._build_lock = threading.Lock()
+        if api_key:
+            self.set_api_key(api_key)
+
+    @property
+    def has_key(self):
+        return self._api_key is not None
+
+    def _ensure_http_client(self):
+        if self._http_client is None:
+            import httpx
+
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=10),
+            )
+        return self._http_client
+
+    def set_api_key(self, api_key):
+        """Use ``api_key`` for new requests; in-flight ones are unaffected."""
+        if self._closed:
+            raise RuntimeError("ImageService is closed")
+        self._api_key = api_key
+        # Rebuilt for the new key on the next request.
+        self._client = None
+
+    def _require_client(self):
+        if self._closed:
+            raise RuntimeError("ImageService is closed")
+        if self._api_key is None:
+            raise RuntimeError("No OpenAI API key has been set")
+        client = self._client
+        if client is None:
+            with self._build_lock:
+                if self._client is None:
+                    from openai import AsyncOpenAI
+
+                    # Retries and timeouts are handled here, not by the SDK.
+                    client = AsyncOpenAI(
+                        api_key=self._api_key, http_client=self._ensure_http_client(), max_retries=0
+                    )
+                    # A lazy property that imports openai's images resources;
+                    # resolve it here too so requests find it cached.
+                    client.images.with_streaming_response
+                    self._client = client
+                client = self._client
+        return client
+
+    async def ensure_client(self):
+        """The client for the current key, imported and built in a thread if needed.
+
+        Importing ``openai`` and its images resources takes the better part
+        of a second, so it never happens on the event loop. Cheap once the
+        client exists.
+        """
+        if self._client is not None and not self._closed:
+            return self._client
+        return await asyncio.to_thread(self._require_client)
+
+    def _stage(self, stage):
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        return self.metrics.stage(stage)
+
+    async def _stream_to_file(self, request, path, kwargs):
+        try:
+            with self._stage("generate"):
+                async with request(**kwargs) as response:
+                    with self._stage("decode"), open(path, "wb") as out:
+                        decoder = B64JsonDecoder(out)
+                        async for chunk in response.iter_bytes(STREAM_CHUNK_SIZE):
+                            decoder.feed(chunk)
+                            if decoder.done:
+                                break
+                        decoder.close()
+        except Exception as e:
+            if self.metrics is not None:
+                status = getattr(e, "status_code", None) or "none"
+                self.metrics.inc("api_errors_total", error=type(e).__name__, status=status)
+            raise
+
+        return decoder.done
+
+    def _count(self, name):
+        if self.metrics is not None:
+            self.metrics.inc(name)
+
+    async def _stream_with_retries(self, request, path, kwargs, deadline):
+        if not self.breaker.allow():
+            self._count("circuit_open_total")
+            raise CircuitOpenError("Image API circuit is open after repeated failures")
+
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + deadline
+        for attempt in range(RETRY_ATTEMPTS):
+            remaining = give_up_at - loop.time()
+            try:
+                written = await asyncio.wait_for(self._stream_to_file(request, path, kwargs), remaining)
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                self.breaker.record_failure()
+                if isinstance(e, asyncio.TimeoutError) and loop.time() >= give_up_at:
+                    self._count("deadline_exceeded_total")
+                    raise
+
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                if (
+                    attempt + 1 == RETRY_ATTEMPTS
+                    or loop.time() + delay >= give_up_at
+                    or not self.breaker.allow()
+                ):
+                    raise
+                self._count("api_retries_total")
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return written
+
+    async def generate_to_file(self, path, deadline=REQUEST_DEADLINE, **kwargs):
+        """``images.generate``, streaming the decoded image straight into ``path``.
+
+        Gives up after ``deadline`` seconds, retries included. Returns
+        ``True`` when an image was written.
+        """
+        images = (await self.ensure_client()).images.with_streaming_response
+        return await self._stream_with_retries(images.generate, path, kwargs, deadline)
+
+    async def edit_to_file(self, path, deadline=REQUEST_DEADLINE, **kwargs):
+        """``images.edit``, streaming the decoded image straight into ``path``."""
+        images = (await self.ensure_client()).images.with_streaming_response
+        return await self._stream_with_retries(images.edit, path, kwargs, deadline)
+
+    async def close(self):
+        self._closed = True
+        self._client = None
+        self._api_key = None
+        if self._http_client is not None:
+            http_client, self._http_client = self._http_client, None
+            await asyncio.shield(http_client.aclose())
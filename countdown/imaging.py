@@ -0,0 +1,333 @@
+import importlib.util
+import io
+import os
+
+
+# Default upload budget; comfortably under Discord's smallest guild upload limit.
+UPLOAD_MAX_BYTES = 4 * 1024 * 1024
+UPLOAD_QUALITIES = (90, 82, 74, 66, 58, 50)
+# Each downscale step shrinks both sides to this fraction.
+DOWNSCALE_STEP = 0.85
+MIN_SIDE = 512
+
+# Output options accepted by the gpt-image models.
+IMAGE_SIZES = ("1024x1024", "1536x1024", "1024x1536", "auto")
+IMAGE_QUALITIES = ("low", "medium", "high", "auto")
+IMAGE_FORMATS = ("png", "jpeg", "webp")
+FORMAT_EXTENSIONS = {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}
+
+# Locally rendered fallback cards: longest side and font search order.
+CARD_MAX_SIDE = 1536
+CARD_FONTS = ("DejaVuSans-Bold.ttf", "DejaVuSans.ttf", "Arial Bold.ttf", "arial.ttf")
+# Default box of render_board's panel, as fractions of the image: the right edge.
+RIGHT_PANEL = (0.667, 0.045, 0.975, 0.955)
+
+# (Image, features) once Pillow was imported, False if it isn't installed.
+_pil = None
+
+
+def load_pil():
+    """Import Pillow on first use. Returns ``(Image, features)`` or ``None``."""
+    global _pil
+    if _pil is None:
+        try:
+            from PIL import Image, features
+        except ImportError:  # Pillow is optional; without it images are uploaded as generated.
+            _pil = False
+        else:
+            _pil = (Image, features)
+    return _pil or None
+
+
+def has_pil():
+    """Whether Pillow is installed, without importing it."""
+    if _pil is None:
+        return importlib.util.find_spec("PIL") is not None
+    return bool(_pil)
+
+
+def upload_format():
+    """The smallest format Pillow can write here: WebP if available, else JPEG."""
+    pil = load_pil()
+    if pil is not None and pil[1].check("webp"):
+        return "WEBP", ".webp"
+    return "JPEG", ".jpg"
+
+
+def variant_path(original_path, extension):
+    root, _ = os.path.splitext(original_path)
+    return f"{root}.upload{extension}"
+
+
+def existing_variant(original_path):
+    """The compressed variant of ``original_path`` if it is already on disk."""
+    if load_pil() is None:
+        return None
+    path = variant_path(original_path, upload_format()[1])
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(original_path):
+        return path
+    return None
+
+
+def _encode(image, target_path, image_format, quality):
+    tmp_path = f"{target_path}.tmp"
+    options = {"quality": quality}
+    if image_format == "WEBP":
+        options["method"] = 4
+    else:
+        options["optimize"] = True
+        options["progressive"] = True
+    image.save(tmp_path, image_format, **options)
+    return tmp_path, os.path.getsize(tmp_path)
+
+
+def compress_for_upload(original_path, max_bytes=UPLOAD_MAX_BYTES):
+    """Re-encode an image to fit ``max_bytes`` and store it next to the original.
+
+    Tries decreasing qualities, then smaller sizes, until the encoded file
+    fits. The variant is kept as ``<name>.upload.webp`` (or ``.jpg``) and
+    reused while it is newer than the original. Returns the path to upload:
+    the variant, or the original when re-encoding doesn't make it smaller or
+    Pillow is not installed. Blocking; run it off the event loop.
+    """
+    pil = load_pil()
+    if pil is None:
+        return original_path
+    Image = pil[0]
+
+    cached = existing_variant(original_path)
+    if cached and os.path.getsize(cached) <= max_bytes:
+        return cached
+
+    image_format, extension = upload_format()
+    target_path = variant_path(original_path, extension)
+
+    with Image.open(original_path) as source:
+        image = source.convert("RGB")
+
+    tmp_path = None
+    while True:
+        for quality in UPLOAD_QUALITIES:
+            tmp_path, size = _encode(image, target_path, image_format, quality)
+            if size <= max_bytes:
+                break
+        if size <= max_bytes or min(image.size) <= MIN_SIDE:
+            break
+        width, height = image.size
+        image = image.resize(
+            (int(width * DOWNSCALE_STEP), int(height * DOWNSCALE_STEP)),
+            Image.LANCZOS,
+        )
+
+    if size >= os.path.getsize(original_path):
+        # Re-encoding didn't help; upload the original as is.
+        os.remove(tmp_path)
+        return original_path
+
+    os.replace(tmp_path, target_path)
+    return target_path
+
+
+def prepare_reference_image(path, max_side):
+    """Downscale an image once and re-encode it compactly for API uploads.
+
+    Returns an ``(filename, bytes, mime_type)`` tuple ready to pass as the
+    ``image`` of ``images.edit``. Without Pillow the file is returned as is.
+    """
+    pil = load_pil()
+    if pil is None:
+        with open(path, "rb") as file:
+            return os.path.basename(path), file.read(), "image/png"
+    Image = pil[0]
+
+    with Image.open(path) as source:
+        image = source.convert("RGB")
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    image_format, extension = upload_format()
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=90)
+    mime_type = "image/webp" if image_format == "WEBP" else "image/jpeg"
+    return f"template{extension}", buffer.getvalue(), mime_type
+
+
+def _card_font(size):
+    from PIL import ImageFont
+
+    for name in CARD_FONTS:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has a single bitmap size
+        return ImageFont.load_default()
+
+
+def _fit_font(draw, text, size, width):
+    """The largest font of at most ``size`` that fits ``text`` into ``width``."""
+    font = _card_font(size)
+    while size > 12 and draw.textlength(text, font=font) > width:
+        size = size * 9 // 10
+        font = _card_font(size)
+    return font
+
+
+def _wrap(draw, text, font, width):
+    lines = []
+    for paragraph in text.splitlines() or [""]:
+        line = ""
+        for word in paragraph.split():
+            candidate = f"{line} {word}".strip()
+            if line and draw.textlength(candidate, font=font) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
+
+
+def render_text_card(background_path, out_path, title, body="", progress=None):
+    """Draw ``title``, ``body`` and an optional progress bar over a background.
+
+    The local fast path for when image generation is unavailable: no
+    network, well under a second. ``progress`` is a percentage. The card is
+    written in the upload format to ``out_path`` (atomically) and returned,
+    or ``None`` without Pillow. Blocking; run it off the event loop.
+    """
+    pil = load_pil()
+    if pil is None:
+        return None
+    Image = pil[0]
+    from PIL import ImageDraw
+
+    with Image.open(background_path) as source:
+        image = source.convert("RGBA")
+    image.thumbnail((CARD_MAX_SIDE, CARD_MAX_SIDE), Image.LANCZOS)
+    width, height = image.size
+    margin = width // 20
+
+    # Darken the lower part so the text stays readable on any background.
+    band_top = height * 11 // 20
+    shade = Image.new("RGBA", image.size, (0, 0, 0, 0))
+    ImageDraw.Draw(shade).rectangle((0, band_top, width, height), fill=(0, 0, 0, 160))
+    image = Image.alpha_composite(image, shade)
+    draw = ImageDraw.Draw(image)
+
+    title_font = _fit_font(draw, title, height // 9, width - 2 * margin)
+    body_font = _card_font(height // 30)
+    y = band_top + margin // 2
+    draw.text((margin, y), title, font=title_font, fill="white")
+    y = draw.textbbox((margin, y), title, font=title_font)[3] + margin // 2
+
+    if progress is not None:
+        bar_height = max(height // 40, 6)
+        filled = margin + (width - 2 * margin) * max(0, min(progress, 100)) // 100
+        draw.rectangle((margin, y, width - margin, y + bar_height), outline="white", width=2)
+        draw.rectangle((margin, y, filled, y + bar_height), fill=(255, 170, 40))
+        y += bar_height + margin // 2
+
+    line_height = draw.textbbox((0, 0), "Ag", font=body_font)[3] * 5 // 4
+    for line in _wrap(draw, body, body_font, width - 2 * margin):
+        if y + line_height > height - margin // 2:
+            break
+        draw.text((margin, y), line, font=body_font, fill="white")
+        y += line_height
+
+    return _save_card(image, out_path)
+
+
+def _save_card(image, out_path):
+    image_format, _ = upload_format()
+    tmp_path = f"{out_path}.tmp"
+    image.convert("RGB").save(tmp_path, image_format, quality=90)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def render_board(scene_path, out_path, heading, number, caption, body="", progress=None,
+                 board=RIGHT_PANEL, calendar=None):
+    """Composite a countdown board onto a generated scene.
+
+    ``board`` is the ``(left, top, right, bottom)`` box to draw in, as
+    fractions of the image size. The text goes on a translucent panel
+    there: ``heading``, ``number`` large, ``caption``, an optional progress
+    bar (a percentage) and ``body`` wrapped below. With ``calendar``, a box
+    inside ``board`` such as a blank card pinned to it, ``number`` is
+    inked onto that instead and the panel takes the rest of the board.
+    Deterministic and fast, so the day-specific part of an image never
+    needs the API. Written in the upload format to ``out_path``
+    (atomically) and returned, or ``None`` without Pillow. Blocking; run
+    it off the event loop.
+    """
+    pil = load_pil()
+    if pil is None:
+        return None
+    Image = pil[0]
+    from PIL import ImageDraw
+
+    with Image.open(scene_path) as source:
+        image = source.convert("RGBA")
+    image.thumbnail((CARD_MAX_SIDE, CARD_MAX_SIDE), Image.LANCZOS)
+    width, height = image.size
+    margin = width // 40
+
+    def scaled(box):
+        return int(box[0] * width), int(box[1] * height), int(box[2] * width), int(box[3] * height)
+
+    left, top, right, bottom = scaled(board)
+    if calendar is not None:
+        card = scaled(calendar)
+        left = card[2] + margin // 2
+    inner = left + margin, right - margin
+    inner_width = inner[1] - inner[0]
+
+    panel = Image.new("RGBA", image.size, (0, 0, 0, 0))
+    ImageDraw.Draw(panel).rounded_rectangle(
+        (left, top, right, bottom), radius=margin, fill=(20, 16, 12, 185), outline=(255, 170, 40, 220), width=3
+    )
+    image = Image.alpha_composite(image, panel)
+    draw = ImageDraw.Draw(image)
+
+    if calendar is not None:
+        # Ink the number onto the card, centred.
+        number_font = _fit_font(draw, str(number), (card[3] - card[1]) * 3 // 5, card[2] - card[0] - margin)
+        draw.text(((card[0] + card[2]) // 2, (card[1] + card[3]) // 2), str(number),
+                  font=number_font, fill=(45, 32, 22), anchor="mm")
+
+    y = top + margin
+    heading_font = _fit_font(draw, heading, height // 16, inner_width)
+    draw.text((inner[0], y), heading, font=heading_font, fill=(255, 170, 40))
+    y = draw.textbbox((inner[0], y), heading, font=heading_font)[3] + margin
+
+    if calendar is None:
+        number_font = _fit_font(draw, str(number), height // 4, inner_width)
+        draw.text((inner[0], y), str(number), font=number_font, fill="white")
+        y = draw.textbbox((inner[0], y), str(number), font=number_font)[3] + margin // 2
+
+    caption_font = _fit_font(draw, caption, height // 20, inner_width)
+    draw.text((inner[0], y), caption, font=caption_font, fill="white")
+    y = draw.textbbox((inner[0], y), caption, font=caption_font)[3] + margin
+
+    if progress is not None:
+        progress = max(0, min(progress, 100))
+        bar_height = max(height // 36, 8)
+        filled = inner[0] + inner_width * progress // 100
+        draw.rectangle((inner[0], y, inner[1], y + bar_height), outline="white", width=2)
+        draw.rectangle((inner[0], y, filled, y + bar_height), fill=(255, 170, 40))
+        y += bar_height + margin // 2
+        percent_font = _card_font(height // 30)
+        draw.text((inner[0], y), f"{progress}%", font=percent_font, fill="white")
+        y = draw.textbbox((inner[0], y), f"{progress}%", font=percent_font)[3] + margin
+
+    body_font = _card_font(height // 34)
+    line_height = draw.textbbox((0, 0), "Ag", font=body_font)[3] * 5 // 4
+    for line in _wrap(draw, body, body_font, inner_width):
+        if y + line_height > bottom - margin // 2:
+            break
+        draw.text((inner[0], y), line, font=body_font, fill="white")
+        y += line_height
+
+    return _save_card(image, out_path)
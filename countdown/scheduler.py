@@ -0,0 +1,129 @@
+import asyncio
+import random
+from datetime import datetime, time, timedelta
+
+
+# Upper bound for one sleep, so clock jumps and suspends are noticed quickly.
+MAX_SLEEP = 300
+# How long shutdown waits for running jobs before cancelling them.
+SHUTDOWN_TIMEOUT = 10
+
+
+class DailyJob:
+    """A coroutine function run every day at ``hour:minute`` in the scheduler's timezone."""
+
+    def __init__(self, name, hour, minute, func, jitter=0, max_concurrency=1):
+        self.name = name
+        self.hour = hour
+        self.minute = minute
+        self.func = func
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.next_run = None
+        self.running = set()
+        self.loop_task = None
+
+
+class Scheduler:
+    """Small asyncio scheduler for a cog's daily jobs.
+
+    Each job runs on its own sleeper task. A run is skipped when the job
+    already has ``max_concurrency`` runs in flight, so slow sends never
+    overlap. Every task the scheduler starts is tracked, its exceptions are
+    reported, and ``shutdown`` waits for (then cancels) whatever is left.
+    """
+
+    def __init__(self, tz):
+        self.tz = tz
+        self.jobs = {}
+        self.tasks = set()
+
+    def _at(self, day, hour, minute):
+        naive = datetime.combine(day, time(hour, minute))
+        if hasattr(self.tz, "localize"):  # pytz
+            return self.tz.localize(naive)
+        return naive.replace(tzinfo=self.tz)
+
+    def _compute_next_run(self, job):
+        now = datetime.now(self.tz)
+        run_at = self._at(now.date(), job.hour, job.minute)
+        if run_at <= now:
+            run_at = self._at(now.date() + timedelta(days=1), job.hour, job.minute)
+        if job.jitter:
+            run_at += timedelta(seconds=random.uniform(0, job.jitter))
+        return run_at
+
+    def spawn(self, coro, name=None):
+        """Start ``coro`` as a tracked task; failures are reported, not lost."""
+        task = asyncio.create_task(coro, name=name)
+        self.tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Scheduled task {task.get_name()} failed: {task.exception()!r}")
+
+    def add_daily(self, name, hour, minute, func, jitter=0, max_concurrency=1):
+        """Register (or replace) a daily job. Returns the ``DailyJob``.
+
+        Runs of a replaced job that are still in flight keep counting
+        towards the new job's concurrency limit.
+        """
+        previous = self.jobs.get(name)
+        job = DailyJob(name, hour, minute, func, jitter, max_concurrency)
+        if previous is not None:
+            previous.loop_task.cancel()
+            job.running = previous.running
+
+        self.jobs[name] = job
+        job.next_run = self._compute_next_run(job)
+        job.loop_task = self.spawn(self._run_loop(job), name=f"{name}-loop")
+        return job
+
+    def remove(self, name):
+        job = self.jobs.pop(name, None)
+        if job is not None:
+            job.loop_task.cancel()
+
+    def next_run(self, name):
+        """When the job fires next, or ``None`` if there is no such job."""
+        job = self.jobs.get(name)
+        return job.next_run if job else None
+
+    async def _run_loop(self, job):
+        while True:
+            while True:
+                remaining = (job.next_run - datetime.now(self.tz)).total_seconds()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(remaining, MAX_SLEEP))
+
+            self.run_now(job.name)
+            job.next_run = self._compute_next_run(job)
+
+    def run_now(self, name):
+        """Start a run of ``name`` immediately unless it is already at its limit."""
+        job = self.jobs[name]
+        if len(job.running) >= job.max_concurrency:
+            print(f"Skipping {name}: previous run still in progress")
+            return None
+
+        task = self.spawn(job.func(), name=name)
+        job.running.add(task)
+        task.add_done_callback(job.running.discard)
+        return task
+
+    async def shutdown(self):
+        """Stop all jobs, give running ones a moment to finish, cancel the rest."""
+        for job in self.jobs.values():
+            job.loop_task.cancel()
+        self.jobs.clear()
+
+        pending = [task for task in self.tasks if not task.done()]
+        if pending:
+            _, still_running = await asyncio.wait(pending, timeout=SHUTDOWN_TIMEOUT)
+            for task in still_running:
+                task.cancel()
+            await asyncio.gather(*still_running, return_exceptions=True)
@@ -0,0 +1,32 @@
+import asyncio
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one.
+
+    The first caller for a key starts the work; callers arriving while it
+    is in flight await the same result instead of starting their own. Once
+    it finishes the key is forgotten, so later calls run again (and are
+    expected to hit whatever cache the work filled).
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func):
+        """Return ``await func()``, sharing one run among concurrent callers."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+
+        # A cancelled caller must not cancel the run the others are waiting on.
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller went away.
+            task.exception()
@@ -1,23 +1,76 @@
-import io
 import os
 
 import discord
-import csv
+import io
 import random
-import aiocron
+import functools
 import json
-import pytz
 from datetime import datetime, timedelta
-from redbot.core import commands
+from zoneinfo import ZoneInfo
+from redbot.core import Config, commands
+from redbot.core.utils.chat_formatting import box
 from redbot.core.bot import Red
-from openai import OpenAI
-import aiohttp
+from redbot.core.utils.menus import DEFAULT_CONTROLS, menu
 import asyncio
-import base64
+from concurrent.futures import ThreadPoolExecutor
+
+from .delivery import Delivery
+from .imagecache import ImageCache, cache_key
+from .imageservice import REQUEST_DEADLINE, ImageService
+from .metrics import Metrics, format_summary
+from .imaging import (
+    FORMAT_EXTENSIONS,
+    IMAGE_FORMATS,
+    IMAGE_QUALITIES,
+    IMAGE_SIZES,
+    UPLOAD_MAX_BYTES,
+    compress_for_upload,
+)
+from .prepared import PreparedQuoteStore
+from .quoteindex import DEFAULT_FILTER, QuoteFilter, QuoteIndex, Rotation, sample_quote
+from .quotestore import QuoteStore
+from .scheduler import Scheduler
+from .singleflight import SingleFlight
 
 
 API_KEY_FILE = "/home/colleague/bot/cogs/CogManager/cogs/dailyquote/openai_api_key.json"
 
+# Channel the cog posted to before per-guild settings; migrated on first load.
+DEFAULT_CHANNEL_ID = 202397765941198848
+# Post time for guilds that haven't set their own.
+DEFAULT_TIME = (11, 0)
+TIMEZONE = ZoneInfo("Europe/London")
+# Random delay (seconds) added to the look-ahead render so it doesn't fire on the minute.
+PREPARE_JITTER = 300
+# A post missed while the bot was down is still sent if it loads within this window.
+CATCH_UP_WINDOW = timedelta(hours=6)
+
+# How many hours before the scheduled send the next quote's image must be ready.
+PREPARE_LEAD_HOURS = 3
+IMAGE_MODEL = "gpt-image-2"
+# Output parameters sent with every images.generate call.
+DEFAULT_IMAGE_OPTIONS = {
+    "size": "1536x1024",
+    "quality": "medium",
+    "output_format": "webp",
+    "output_compression": 85,
+}
+# Seconds a scheduled send waits for the quote worker before using the fallback.
+QUOTE_LOAD_TIMEOUT = 10
+# Upper bound for the cache of generated quote images before LRU eviction.
+IMAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Seconds a post may spend waiting for its image before it goes out without one.
+POST_DEADLINE = 90
+# Results fetched per search/browse command, shown QUOTES_PER_PAGE at a time.
+SEARCH_RESULT_LIMIT = 50
+QUOTES_PER_PAGE = 5
+# Longest quote text shown in search results before it is cut.
+RESULT_QUOTE_CHARS = 600
+FALLBACK_QUOTE = {
+    "quote": "The journey of a thousand miles begins with one step.",
+    "author": "Lao Tzu",
+}
+
 
 class DailyQuoteCog(commands.Cog):
     """A cog to send a daily quote with a random emote reaction."""
@@ -25,49 +78,333 @@ class DailyQuoteCog(commands.Cog):
 
     def __init__(self, bot: Red):
         self.bot = bot
-        self.channel_id = 202397765941198848  # Default channel ID
-        self.scheduled_cron = None
-        self.current_cron_time = (11, 0)  # Default time
-        self.set_cron_job(11, 0)  # Default time
-        self.client = None  # Initialize client as None
+        self.config = Config.get_conf(self, identifier=202397765941198849, force_registration=True)
+        self.config.register_global(
+            # Legacy single-channel settings, moved to the channel's guild on load.
+            channel_id=DEFAULT_CHANNEL_ID,
+            last_run=None,
+            hour=DEFAULT_TIME[0],
+            minute=DEFAULT_TIME[1],
+            include_tags=[],
+            exclude_tags=sorted(DEFAULT_FILTER.exclude),
+            upload_max_bytes=UPLOAD_MAX_BYTES,
+            image_options=DEFAULT_IMAGE_OPTIONS,
+            # Where a metrics snapshot is written after every post (.json or Prometheus text).
+            metrics_export_path=None,
+            # No-repeat rotation over the indexed or imported quotes (see quoteindex.Rotation).
+            rotation=None,
+        )
+        self.config.register_guild(
+            channel_id=None,
+            # None means the default time.
+            hour=None,
+            minute=None,
+            # Run ledger: date of the last scheduled slot posted in this guild.
+            last_run=None,
+        )
+        # Runs the daily jobs and tracks every background task of the cog.
+        self.scheduler = Scheduler(TIMEZONE)
+        self.current_cron_time = DEFAULT_TIME
+        # Stage latencies and counters for the generate -> upload pipeline.
+        self.metrics = Metrics("dailyquote")
+        self.metrics_export_path = None
+        # One pooled async OpenAI session for every image request
+        self.images = ImageService(metrics=self.metrics)
+        # Resolves channels (cache first, REST memoised) and sends to them.
+        self.delivery = Delivery(bot, self.scheduler.spawn, metrics=self.metrics)
         self.api_key = None
-        self.load_api_key()
-
-    def set_cron_job(self, hour, minute):
-        if self.scheduled_cron:
-            self.scheduled_cron.stop()  # Remove the previous cron job
-
-        self.current_cron_time = (hour, minute)
-        cron_expr = f"{minute} {hour} * * *"
-        self.scheduled_cron = aiocron.crontab(
-            cron_expr,
-            func=lambda: asyncio.create_task(self.send_scheduled_message()),
-            start=True
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        # Tomorrow's quote and image are rendered ahead of time into this slot.
+        self.prepared = PreparedQuoteStore(os.path.join(current_dir, "generated"))
+        # Today's quote, generated once and posted to every subscribed channel.
+        self.current = PreparedQuoteStore(os.path.join(current_dir, "generated"), name="current_quote")
+        # Every generated image by prompt and options, so a quote that comes
+        # round again (or a retried prepare) doesn't pay for a new one.
+        self.image_cache = ImageCache(os.path.join(current_dir, "generated", "cache"), IMAGE_CACHE_MAX_BYTES)
+        self._post_lock = asyncio.Lock()
+        self._prepare_lock = asyncio.Lock()
+        self._prepare_task = None
+        self._warm_up_task = None
+        # Concurrent requests for the same image share one generation.
+        self._generations = SingleFlight()
+        self.upload_max_bytes = UPLOAD_MAX_BYTES
+        self.image_options = dict(DEFAULT_IMAGE_OPTIONS)
+        self.quotes_path = os.path.join(current_dir, "quotes.csv")
+        self.quote_index = QuoteIndex(self.quotes_path)
+        # Indexed SQLite copy of the corpus, created by the import_quotes command.
+        self.quote_store = QuoteStore(os.path.join(current_dir, "quotes.db"), self.quotes_path)
+        self.quote_filter = DEFAULT_FILTER
+        self.rotation = Rotation()
+        # All quote-corpus I/O runs on this single worker, never on the event loop.
+        self.quote_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dailyquote")
+        # Search and browse commands read the quote store here, so they never
+        # queue behind an import or a slow pick.
+        self.lookup_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="dailyquote-lookup")
+
+    async def cog_load(self):
+        # Nothing blocking here: file reads run in a thread and everything
+        # heavier (index, image clients, Pillow) happens in the background or
+        # on first use.
+        await asyncio.to_thread(self.load_api_key)
+        await self.load_settings()
+        await self.refresh_schedule()
+        self.scheduler.spawn(self.catch_up_missed_run(), name="quote-catch-up")
+        # Build (or validate) the quote index and prepare the next quote in
+        # the background so the first scheduled send doesn't have to wait.
+        self._warm_up_task = self.scheduler.spawn(self._warm_up(), name="quote-warm-up")
+
+    async def load_settings(self):
+        settings = await self.config.all()
+        self.current_cron_time = (settings["hour"], settings["minute"])
+        self.quote_filter = QuoteFilter(settings["include_tags"], settings["exclude_tags"])
+        self.upload_max_bytes = settings["upload_max_bytes"]
+        self.image_options = dict(settings["image_options"])
+        self.rotation = Rotation.from_dict(settings["rotation"])
+        self.metrics_export_path = settings["metrics_export_path"]
+
+    async def save_quote_filter(self):
+        await self.config.include_tags.set(sorted(self.quote_filter.include))
+        await self.config.exclude_tags.set(sorted(self.quote_filter.exclude))
+
+    async def cog_unload(self):
+        await self.scheduler.shutdown()
+        self.quote_executor.shutdown(wait=False, cancel_futures=True)
+        self.lookup_executor.shutdown(wait=False, cancel_futures=True)
+        await self.images.close()
+        await self.image_cache.flush()
+
+    async def _warm_up(self):
+        # Let the bot (and the other cogs) finish loading first.
+        await self.bot.wait_until_red_ready()
+        if self.images.has_key:
+            # Import openai and build the client now, not during the first post.
+            await self.images.ensure_client()
+        await self.image_cache.load()
+        try:
+            # Today's image goes to every channel; keep it in memory.
+            post = await asyncio.to_thread(self.current.load)
+            if post and post["upload_path"]:
+                await self.image_cache.read(post["upload_path"])
+        except OSError as e:
+            print(f"Error loading the current quote image: {e}")
+        loop = asyncio.get_running_loop()
+        try:
+            if self.quote_store.exists():
+                # Picks up rows appended to quotes.csv (or rebuilds if it was edited).
+                await loop.run_in_executor(self.quote_executor, self.quote_store.refresh)
+            else:
+                await loop.run_in_executor(self.quote_executor, self.quote_index.ensure)
+        except Exception as e:
+            print(f"Error building quote index: {e}")
+
+        self.schedule_prepare()
+
+    async def subscriptions(self):
+        """Map each post time ``(hour, minute)`` to its ``(guild_id, channel_id)`` list."""
+        slots = {}
+        for guild_id, data in (await self.config.all_guilds()).items():
+            if not data["channel_id"]:
+                continue
+            if data["hour"] is None:
+                post_time = self.current_cron_time
+            else:
+                post_time = (data["hour"], data["minute"])
+            slots.setdefault(post_time, []).append((guild_id, data["channel_id"]))
+        return slots
+
+    @staticmethod
+    def slot_job_name(post_time):
+        return f"quote-{post_time[0]:02}:{post_time[1]:02}"
+
+    async def refresh_schedule(self):
+        """Keep one scheduler job per distinct post time in use."""
+        slots = await self.subscriptions()
+        wanted = {self.slot_job_name(post_time): post_time for post_time in slots}
+
+        for name in list(self.scheduler.jobs):
+            if name.startswith("quote-") and name not in wanted:
+                self.scheduler.remove(name)
+
+        for name, (hour, minute) in wanted.items():
+            if name not in self.scheduler.jobs:
+                self.scheduler.add_daily(name, hour, minute, functools.partial(self.run_slot, (hour, minute)))
+
+        # Safety net: if the look-ahead render after the last send failed,
+        # retry it a few hours before the first post of the day is due.
+        hour, minute = min(slots, default=self.current_cron_time)
+        prepare_hour = (hour - PREPARE_LEAD_HOURS) % 24
+        self.scheduler.add_daily(
+            "prepare-quote", prepare_hour, minute, self.prepare_next_quote, jitter=PREPARE_JITTER
         )
 
+    @staticmethod
+    def last_slot(now, post_time):
+        """The most recent ``post_time`` at or before ``now``."""
+        hour, minute = post_time
+        slot = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if slot > now:
+            slot -= timedelta(days=1)
+        return slot
+
+    async def claim_run(self, guild_id, slot):
+        """Record ``slot`` in the guild's run ledger; ``False`` if it was already posted."""
+        key = slot.date().isoformat()
+        guild_config = self.config.guild_from_id(guild_id)
+        last_run = await guild_config.last_run()
+        if last_run is not None and last_run >= key:
+            return False
+        await guild_config.last_run.set(key)
+        return True
+
+    async def run_slot(self, post_time, slot=None):
+        """Post the day's quote to every channel scheduled at ``post_time``, once each."""
+        if slot is None:
+            slot = self.last_slot(datetime.now(TIMEZONE), post_time)
+
+        channel_ids = []
+        for guild_id, channel_id in (await self.subscriptions()).get(post_time, []):
+            if await self.claim_run(guild_id, slot):
+                channel_ids.append(channel_id)
+        if not channel_ids:
+            return
+
+        # Generated once per day, then uploaded to every channel.
+        post = await self.get_daily_post(slot.date())
+        results = await self.delivery.fan_out(channel_ids, functools.partial(self.send_quote, post=post))
+        for channel_id, result in zip(channel_ids, results):
+            if isinstance(result, Exception):
+                print(f"Error sending daily quote to {channel_id}: {result}")
+        await self.export_metrics()
+
+    async def migrate_legacy_channel(self):
+        """Move the pre-guild global channel setting to its guild."""
+        channel_id = await self.config.channel_id()
+        if channel_id is None:
+            return
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            return
+
+        guild_config = self.config.guild(channel.guild)
+        if await guild_config.channel_id() is None:
+            await guild_config.channel_id.set(channel_id)
+            await guild_config.last_run.set(await self.config.last_run())
+        await self.config.channel_id.set(None)
+        await self.refresh_schedule()
+
+    async def catch_up_missed_run(self):
+        """Send each guild's last scheduled quote once if it was missed while offline."""
+        await self.bot.wait_until_red_ready()
+        await self.migrate_legacy_channel()
+        now = datetime.now(TIMEZONE)
+
+        for post_time, targets in (await self.subscriptions()).items():
+            slot = self.last_slot(now, post_time)
+            for guild_id, _ in targets:
+                guild_config = self.config.guild_from_id(guild_id)
+                if await guild_config.last_run() is None:
+                    # New subscription: start the ledger instead of posting right away.
+                    await guild_config.last_run.set(slot.date().isoformat())
+
+            if now - slot <= CATCH_UP_WINDOW:
+                await self.run_slot(post_time, slot)
+
     def get_random_quote_from_csv(self):
         print("Getting random quote from csv")
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        quotes_path = os.path.join(current_dir, "quotes.csv")
         try:
-            with open(quotes_path, mode="r", encoding="utf-8") as file:
-                reader = csv.reader(file)
-                quotes = [
-                    {"quote": row[0], "author": row[1]}
-                    for row in reader
-                    if len(row) >= 3 and "romance" not in row[2].lower()
-                ]
-
-                print("Quotes loaded")
-
-                if quotes:
-                    print("Returning random quote")
-                    return random.choice(quotes)
+            if self.quote_store.exists():
+                # Primary-key lookups in the imported store, for any tag filter.
+                return self.quote_store.pick_next(self.rotation, self.quote_filter)
+            if self.quote_filter == DEFAULT_FILTER:
+                # Seeks straight to one row through the on-disk offset index;
+                # the index is (re)built only when quotes.csv changes. The
+                # rotation makes sure no quote repeats until all were used.
+                return self.quote_index.pick_next(self.rotation)
+            # Custom tag filters stream the corpus once with constant memory.
+            return sample_quote(self.quotes_path, self.quote_filter)
         except Exception as e:
             print(f"Error reading CSV: {e}")
 
         return None
 
+    async def fetch_random_quote(self):
+        """Pick a quote on the quote worker, falling back if it takes too long."""
+        loop = asyncio.get_running_loop()
+        try:
+            quote = await asyncio.wait_for(
+                loop.run_in_executor(self.quote_executor, self.get_random_quote_from_csv),
+                timeout=QUOTE_LOAD_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            print("Timed out getting a quote, using fallback")
+            quote = None
+
+        if quote:
+            await self.config.rotation.set(self.rotation.to_dict())
+        return quote or FALLBACK_QUOTE
+
+    def schedule_prepare(self):
+        """Start preparing the next quote in the background unless already running."""
+        if self._prepare_task is None or self._prepare_task.done():
+            self._prepare_task = self.scheduler.spawn(self.prepare_next_quote(), name="prepare-quote")
+        return self._prepare_task
+
+    async def prepare_next_quote(self):
+        """Select the next quote and render its image ahead of the scheduled time."""
+        async with self._prepare_lock:
+            try:
+                prepared = await asyncio.to_thread(self.prepared.load)
+                if prepared and prepared["image_path"]:
+                    return
+
+                if prepared:
+                    # Saved without an image (failed render, open circuit,
+                    # no key yet): keep the quote, try the image again.
+                    quote = {"quote": prepared["quote"], "author": prepared["author"]}
+                else:
+                    quote = await self.fetch_random_quote()
+                    if quote is FALLBACK_QUOTE:
+                        # Don't lock in the fallback; the next attempt picks a real quote.
+                        return
+
+                options = dict(self.image_options)
+                has_image = await self.generate_image_from_quote(
+                    quote["quote"], quote["author"], self.prepared.image_tmp_path, options
+                )
+                with self.metrics.stage("cache_write"):
+                    image_path = await asyncio.to_thread(
+                        self.prepared.save, quote, has_image, FORMAT_EXTENSIONS[options["output_format"]]
+                    )
+                if image_path:
+                    await self.upload_variant(image_path)
+                print("Next quote prepared")
+            except Exception as e:
+                print(f"Error preparing next quote: {e}")
+
+    async def upload_variant(self, image_path):
+        """Compressed copy of an image that fits the upload budget."""
+        try:
+            with self.metrics.stage("compress"):
+                return await asyncio.to_thread(compress_for_upload, image_path, self.upload_max_bytes)
+        except Exception as e:
+            print(f"Error compressing image: {e}")
+            return image_path
+
+    async def export_metrics(self):
+        if not self.metrics_export_path:
+            return
+        try:
+            await asyncio.to_thread(self.metrics.export, self.metrics_export_path)
+        except OSError as e:
+            print(f"Error exporting metrics: {e}")
+
+    async def invalidate_prepared_quote(self):
+        """Drop the prepared quote (e.g. after a filter change) and render a new one."""
+        if self._prepare_task and not self._prepare_task.done():
+            self._prepare_task.cancel()
+        await asyncio.to_thread(self.prepared.discard)
+        self.schedule_prepare()
+
 
     def load_api_key(self):
         """Load the OpenAI API key from the file."""
@@ -76,8 +413,7 @@ class DailyQuoteCog(commands.Cog):
                 data = json.load(file)
                 self.api_key = data.get('api_key')
                 if self.api_key:
-                    # Updated API client setup
-                    self.client = OpenAI(api_key=self.api_key)
+                    self.images.set_api_key(self.api_key)
 
     def save_api_key(self, api_key):
         """Save the OpenAI API key to a file."""
@@ -88,8 +424,9 @@ class DailyQuoteCog(commands.Cog):
     async def set_openai_key(self, ctx, api_key: str):
         """Set the OpenAI API key."""
         self.save_api_key(api_key)
-        # Updated API client setup
-        self.client = OpenAI(api_key=api_key)
+        # Rotates the key without dropping requests already in flight
+        self.api_key = api_key
+        self.images.set_api_key(api_key)
         await ctx.send("OpenAI API key has been set successfully.")
 
     @commands.command()
@@ -100,108 +437,379 @@ class DailyQuoteCog(commands.Cog):
         else:
             await ctx.send("No OpenAI API key has been set.")
 
-    async def generate_image_from_quote(self, quote_text, author):
+    async def generate_image_from_quote(self, quote_text, author, path, options=None, deadline=REQUEST_DEADLINE):
+        """Generate an image for the quote and write it to ``path``.
+
+        ``options`` are the output parameters (size, quality, format) and
+        default to the cog's current ones. The image is decoded from the
+        response stream straight to disk; transient API errors are retried
+        until ``deadline`` seconds have passed. Images are kept in the image
+        cache by prompt and options. Concurrent calls for the same quote and
+        options share a single generation, which writes its own file in the
+        cache; every caller then gets its own copy at ``path``. Returns
+        ``True`` on success.
+        """
         if not self.api_key:
-            return None
+            return False
+
+        options = dict(options or self.image_options)
+        prompt = self.build_prompt(quote_text, author)
+        key = cache_key(IMAGE_MODEL, prompt, sorted(options.items()))
+        cached = await self.image_cache.lookup(key)
+        self.metrics.inc("image_cache_total", result="miss" if cached is None else "hit")
+        if cached is None:
+            cached = await self._generations.do(
+                key, functools.partial(self._generate_image_from_quote, key, prompt, author, options, deadline)
+            )
+        if cached is None:
+            return False
 
         try:
-            # Run the synchronous OpenAI call in a background thread
-            def _generate():
-                return self.client.images.generate(
-                    model="gpt-image-2",
-                    prompt = (
-                        f'Create a cinematic, photorealistic image inspired by the quote: "{quote_text}" by {author}. '
-                        f'Translate the quote into a surreal visual scene filled with irony, emotional tension, and dreamlike strangeness. '
-                        f'The main subjects are realistic cats with lifelike fur, anatomy, and natural texture, but their expressions should feel oddly human, contemplative, exaggerated, or quietly absurd. '
-                        f'The setting can be impossible, symbolic, or dreamlike: floating architecture, distorted scale, strange weather, impossible interiors, or poetic visual contradictions. '
-                        f'Include surreal details that feel clever and intriguing rather than frightening. '
-                        f'The composition should tell a silent story through body language, expression, symbolism, and unexpected visual relationships. '
-                        f'Use luminous cinematic lighting, rich color, elegant contrast, and striking visual clarity. '
-                        f'The result should feel like an intelligent surreal photograph: strange, beautiful, emotionally layered, and slightly uncanny, with a sense of wonder or dark humor rather than horror. '
-                        f'Do not include the quote text in the image. '
-                        f'Do not make it cartoonish, gothic, creepy, bleak, or horror-like.'
-                    ),
-                    n=1,
-                    size="1536x1024",
-                    quality="medium"
-                )
+            await self.image_cache.copy_to(cached, path)
+        except OSError as e:
+            # Evicted between the generation and the copy.
+            print(f"Error copying the generated image: {e}")
+            return False
+        return True
+
+    @staticmethod
+    def build_prompt(quote_text, author):
+        return (
+            f'Create a cinematic, photorealistic image inspired by the quote: "{quote_text}" by {author}. '
+            f'Translate the quote into a surreal visual scene filled with irony, emotional tension, and dreamlike strangeness. '
+            f'The main subjects are realistic cats with lifelike fur, anatomy, and natural texture, but their expressions should feel oddly human, contemplative, exaggerated, or quietly absurd. '
+            f'The setting can be impossible, symbolic, or dreamlike: floating architecture, distorted scale, strange weather, impossible interiors, or poetic visual contradictions. '
+            f'Include surreal details that feel clever and intriguing rather than frightening. '
+            f'The composition should tell a silent story through body language, expression, symbolism, and unexpected visual relationships. '
+            f'Use luminous cinematic lighting, rich color, elegant contrast, and striking visual clarity. '
+            f'The result should feel like an intelligent surreal photograph: strange, beautiful, emotionally layered, and slightly uncanny, with a sense of wonder or dark humor rather than horror. '
+            f'Do not include the quote text in the image. '
+            f'Do not make it cartoonish, gothic, creepy, bleak, or horror-like.'
+        )
 
-            # Execute in background thread
-            response = await asyncio.to_thread(_generate)
+    async def _generate_image_from_quote(self, key, prompt, author, options, deadline):
+        # A previous flight may have filled the cache between the check and this run.
+        cached = await self.image_cache.lookup(key)
+        if cached is not None:
+            return cached
 
-            if response and response.data:
-                b64_image = response.data[0].b64_json
-                img_bytes = base64.b64decode(b64_image)
+        tmp_path = self.image_cache.temp_path_for(key)
+        try:
+            written = await self.images.generate_to_file(
+                tmp_path,
+                deadline=deadline,
+                model=IMAGE_MODEL,
+                prompt=prompt,
+                n=1,
+                **options
+            )
+
+            if written:
                 print("Image successfully generated")
-                return img_bytes  # Return raw bytes, not a URL
+                with self.metrics.stage("cache_write"):
+                    return await self.image_cache.store(
+                        key,
+                        tmp_path,
+                        meta={"author": author},
+                        extension=FORMAT_EXTENSIONS[options["output_format"]],
+                    )
             else:
                 print("No image data returned from OpenAI.")
-                return None
 
         except Exception as e:
             print(f"Error generating image from OpenAI: {e}")
-            return None
 
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
 
-    async def send_scheduled_message(self):
-        channel = self.bot.get_channel(self.channel_id)
-        if not channel:
-            return
 
-        random_quote = self.get_random_quote_from_csv()
-        if random_quote:
-            embed = discord.Embed(
-                title="Dienos mintis",
-                description=random_quote["quote"],
-                color=discord.Color.blue()
-            )
-            embed.set_footer(text=f"- {random_quote['author']}")
+    @staticmethod
+    def upload_filename(path):
+        return "quote_image" + os.path.splitext(path)[1]
+
+    async def get_daily_post(self, day):
+        """The quote and image for ``day``, generated at most once per day."""
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + POST_DEADLINE
+        async with self._post_lock:
+            post = await asyncio.to_thread(self.current.load)
+            if post is None or post["day"] != day.isoformat():
+                # The warm-up or look-ahead render is still running; wait for
+                # it rather than paying for a second image. Looked up again
+                # each time: the warm-up starts the render, and a tag change
+                # cancels it and starts a new one.
+                while True:
+                    waiting = [
+                        task for task in (self._warm_up_task, self._prepare_task)
+                        if task is not None and not task.done()
+                    ]
+                    if not waiting:
+                        break
+                    if loop.time() >= give_up_at:
+                        print("Prepared quote not ready in time")
+                        break
+                    # Unlike awaiting the task, this neither raises when it was
+                    # cancelled or failed nor cancels it on timeout.
+                    await asyncio.wait(waiting, timeout=give_up_at - loop.time())
+                # Normally the quote and its image were rendered hours ago,
+                # so they only have to be moved into place.
+                # Yesterday's image is never posted again.
+                self.image_cache.hot.forget(self.current.image_stem)
+                post = await asyncio.to_thread(self.prepared.move_to, self.current, day.isoformat())
+                self.metrics.inc("prepared_total", result="miss" if post is None else "hit")
+                if post is None:
+                    # Nothing prepared in time: generate inline.
+                    quote = await self.fetch_random_quote()
+                    options = dict(self.image_options)
+                    # Past the deadline the quote goes out as text only.
+                    has_image = await self.generate_image_from_quote(
+                        quote["quote"],
+                        quote["author"],
+                        self.current.image_tmp_path,
+                        options,
+                        deadline=max(give_up_at - loop.time(), 1),
+                    )
+                    with self.metrics.stage("cache_write"):
+                        await asyncio.to_thread(
+                            self.current.save,
+                            quote,
+                            has_image,
+                            FORMAT_EXTENSIONS[options["output_format"]],
+                            day.isoformat(),
+                        )
+                    post = await asyncio.to_thread(self.current.load)
+                self.schedule_prepare()
+
+            if post["image_path"]:
+                post["upload_path"] = await self.upload_variant(post["image_path"])
+            return post
+
+    async def send_quote(self, channel, post):
+        embed = discord.Embed(
+            title="Dienos mintis",
+            description=post["quote"],
+            color=discord.Color.blue()
+        )
+        embed.set_footer(text=f"- {post['author']}")
 
-            # Generate the image as raw data
-            # Generate the image and handle as an attachment
-            image_bytes = await self.generate_image_from_quote(random_quote["quote"], random_quote["author"])
-            if image_bytes:
-                image_file = discord.File(io.BytesIO(image_bytes), filename="quote_image.png")
+        if post["upload_path"]:
+            # Read once and served from memory to every other channel.
+            data = await self.image_cache.read(post["upload_path"])
+            image_file = discord.File(io.BytesIO(data), filename=self.upload_filename(post["upload_path"]))
+            with self.metrics.stage("upload"):
                 message = await channel.send(embed=embed, file=image_file)
-            else:
-                message = await channel.send(embed=embed)
+            self.metrics.inc("uploaded_bytes_total", len(data))
+        else:
+            message = await channel.send(embed=embed)
 
-            # React to the message with a random emote
-            guild = channel.guild
-            emotes = guild.emojis
-            if emotes:
-                random_emote = random.choice(emotes)
-                await message.add_reaction(random_emote)
+        # React with a random emote in the background; the next channel doesn't wait for it.
+        emotes = getattr(channel.guild, "emojis", ())
+        if emotes:
+            self.delivery.follow_up(message.add_reaction, random.choice(emotes), name="quote-reaction")
+        return message
 
 
     @commands.command()
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
     async def set_quote_channel(self, ctx, channel: discord.TextChannel):
-        """Set the channel where daily quotes will be sent."""
-        self.channel_id = channel.id
+        """Set the channel where daily quotes will be sent in this server."""
+        await self.config.guild(ctx.guild).channel_id.set(channel.id)
+        await self.refresh_schedule()
         await ctx.send(f"Daily quotes channel set to {channel.mention}.")
 
     @commands.command()
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    async def remove_quote_channel(self, ctx):
+        """Stop sending daily quotes in this server."""
+        await self.config.guild(ctx.guild).channel_id.set(None)
+        await self.refresh_schedule()
+        await ctx.send("Daily quotes will no longer be sent in this server.")
+
+    @commands.command()
+    @commands.is_owner()
+    async def set_quote_upload_limit(self, ctx, kilobytes: int):
+        """Set the maximum size of uploaded quote images, in kilobytes."""
+        if kilobytes < 100:
+            await ctx.send("The upload limit must be at least 100 KB.")
+            return
+        self.upload_max_bytes = kilobytes * 1024
+        # Variants for the old limit won't be uploaded again.
+        self.image_cache.hot.clear()
+        await self.config.upload_max_bytes.set(self.upload_max_bytes)
+        await ctx.send(f"Quote images will be compressed to at most {kilobytes} KB.")
+
+    @commands.command()
+    @commands.is_owner()
+    async def set_quote_image_options(self, ctx, size: str, quality: str, output_format: str, compression: int = 85):
+        """Set the size, quality and format of generated quote images."""
+        output_format = output_format.lower()
+        if (
+            size not in IMAGE_SIZES
+            or quality not in IMAGE_QUALITIES
+            or output_format not in IMAGE_FORMATS
+            or not 0 <= compression <= 100
+        ):
+            await ctx.send(
+                f"Invalid options. Sizes: {', '.join(IMAGE_SIZES)}; qualities: {', '.join(IMAGE_QUALITIES)}; "
+                f"formats: {', '.join(IMAGE_FORMATS)}; compression: 0-100."
+            )
+            return
+
+        self.image_options = {"size": size, "quality": quality, "output_format": output_format}
+        if output_format != "png":
+            self.image_options["output_compression"] = compression
+        await self.config.image_options.set(self.image_options)
+        await ctx.send(f"Quote images will be generated at {size}, {quality} quality, as {output_format}.")
+
+    @commands.command()
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
     async def set_quote_time(self, ctx, hour: int, minute: int):
-        """Set the time for daily quotes (24-hour format)."""
+        """Set the time for daily quotes in this server (24-hour format)."""
         if 0 <= hour < 24 and 0 <= minute < 60:
-            self.set_cron_job(hour, minute)
+            guild_config = self.config.guild(ctx.guild)
+            await guild_config.hour.set(hour)
+            await guild_config.minute.set(minute)
+            await self.refresh_schedule()
             await ctx.send(f"Daily quotes time set to {hour:02}:{minute:02}.")
         else:
             await ctx.send("Invalid time. Please provide a valid hour (0-23) and minute (0-59).")
 
     @commands.command()
-    async def time_until_next_quote(self, ctx):
-        """Get the time remaining until the next scheduled quote."""
-        uk_tz = pytz.timezone("Europe/London")
-        now = datetime.now(uk_tz)
-        hour, minute = self.current_cron_time
-        next_quote_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    @commands.is_owner()
+    async def exclude_quote_tag(self, ctx, *, tag: str):
+        """Never pick quotes whose category contains this tag."""
+        self.quote_filter = self.quote_filter.with_tags(exclude=[tag])
+        await self.save_quote_filter()
+        await self.invalidate_prepared_quote()
+        await ctx.send(f"Quotes tagged `{tag.strip().lower()}` will be skipped.")
+
+    @commands.command()
+    @commands.is_owner()
+    async def include_quote_tag(self, ctx, *, tag: str):
+        """Only pick quotes whose category contains one of the included tags."""
+        self.quote_filter = self.quote_filter.with_tags(include=[tag])
+        await self.save_quote_filter()
+        await self.invalidate_prepared_quote()
+        await ctx.send(f"Quotes tagged `{tag.strip().lower()}` are now included.")
+
+    @commands.command()
+    @commands.is_owner()
+    async def reset_quote_tags(self, ctx):
+        """Reset the quote tag filters to the default."""
+        self.quote_filter = DEFAULT_FILTER
+        await self.save_quote_filter()
+        await self.invalidate_prepared_quote()
+        await ctx.send("Quote tag filters have been reset.")
+
+    @commands.command()
+    async def quote_tags(self, ctx):
+        """Show the current quote tag filters."""
+        include = ", ".join(sorted(self.quote_filter.include)) or "any"
+        exclude = ", ".join(sorted(self.quote_filter.exclude)) or "none"
+        await ctx.send(f"Included tags: {include}\nExcluded tags: {exclude}")
+
+    async def send_quote_results(self, ctx, title, lookup, term):
+        """Run a quote store lookup and show the results as a paged menu."""
+        if not self.quote_store.exists():
+            await ctx.send("Quote search is not available until the quotes are imported (import_quotes).")
+            return
+
+        loop = asyncio.get_running_loop()
+        quotes = await loop.run_in_executor(self.lookup_executor, lookup, term, SEARCH_RESULT_LIMIT)
+        if not quotes:
+            await ctx.send("No quotes found.")
+            return
+
+        page_count = (len(quotes) + QUOTES_PER_PAGE - 1) // QUOTES_PER_PAGE
+        pages = []
+        for page, start in enumerate(range(0, len(quotes), QUOTES_PER_PAGE), 1):
+            lines = []
+            for quote in quotes[start:start + QUOTES_PER_PAGE]:
+                text = quote["quote"]
+                if len(text) > RESULT_QUOTE_CHARS:
+                    text = text[:RESULT_QUOTE_CHARS - 1] + "…"
+                lines.append(f"{text}\n*- {quote['author']}*")
+
+            embed = discord.Embed(title=title[:256], description="\n\n".join(lines), color=discord.Color.blue())
+            embed.set_footer(text=f"Page {page} of {page_count}")
+            pages.append(embed)
 
-        # If the next quote time is in the past, move to the next day
-        if now >= next_quote_time:
-            next_quote_time += timedelta(days=1)
+        await menu(ctx, pages, DEFAULT_CONTROLS)
+
+    @commands.command()
+    @commands.is_owner()
+    async def quote_stats(self, ctx):
+        """Show recent p50/p95 latencies and counters of the quote pipeline."""
+        await ctx.send(box(format_summary(self.metrics)))
+        await self.export_metrics()
+
+    @commands.command()
+    @commands.is_owner()
+    async def set_quote_metrics_export(self, ctx, path: str = None):
+        """Write a metrics snapshot to a file after every post (.json, else Prometheus text).
+
+        Run without a path to stop exporting.
+        """
+        self.metrics_export_path = path
+        await self.config.metrics_export_path.set(path)
+        if path is None:
+            await ctx.send("Metrics export disabled.")
+            return
+
+        await self.export_metrics()
+        await ctx.send(f"Metrics will be written to `{path}`.")
+
+    @commands.group(name="quote", invoke_without_command=True)
+    async def quote_group(self, ctx):
+        """Search and browse the quote collection."""
+        await ctx.send_help()
+
+    @quote_group.command(name="search")
+    async def quote_search(self, ctx, *, text: str):
+        """Find quotes containing all of the given words."""
+        await self.send_quote_results(ctx, f"Quotes matching \"{text}\"", self.quote_store.search, text)
+
+    @quote_group.command(name="author")
+    async def quote_author(self, ctx, *, name: str):
+        """Show quotes by an author."""
+        await self.send_quote_results(ctx, f"Quotes by {name}", self.quote_store.by_author, name)
+
+    @quote_group.command(name="tag")
+    async def quote_tag(self, ctx, *, category: str):
+        """Show quotes in a category."""
+        await self.send_quote_results(ctx, f"Quotes tagged {category}", self.quote_store.by_tag, category)
+
+    @commands.command()
+    @commands.is_owner()
+    async def import_quotes(self, ctx):
+        """Import quotes.csv into the indexed quote store (one-time, then kept in sync)."""
+        await ctx.send("Importing quotes, this can take a minute...")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            count = await loop.run_in_executor(self.quote_executor, self.quote_store.build)
+        except Exception as e:
+            await ctx.send(f"Import failed: {e}")
+            return
+
+        await ctx.send(f"Imported {count} quotes in {loop.time() - started:.0f} seconds.")
+
+    @commands.command()
+    @commands.guild_only()
+    async def time_until_next_quote(self, ctx):
+        """Get the time remaining until the next scheduled quote in this server."""
+        data = await self.config.guild(ctx.guild).all()
+        post_time = self.current_cron_time if data["hour"] is None else (data["hour"], data["minute"])
+        next_quote_time = self.scheduler.next_run(self.slot_job_name(post_time)) if data["channel_id"] else None
+        if next_quote_time is None:
+            await ctx.send("No daily quote is scheduled.")
+            return
 
-        time_remaining = next_quote_time - now
+        time_remaining = max(next_quote_time - datetime.now(TIMEZONE), timedelta(0))
         hours, remainder = divmod(time_remaining.seconds, 3600)
         minutes, _ = divmod(remainder, 60)
 
@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+import discord
+
+from .singleflight import SingleFlight
+
+
+# How many channels are posted to at the same time.
+MAX_PARALLEL_SENDS = 5
+# Attempts per channel when Discord answers with 429.
+SEND_ATTEMPTS = 3
+# Seconds a channel fetched over REST is reused, and a missing or
+# inaccessible channel is not asked for again.
+CHANNEL_MEMO_TTL = 3600
+CHANNEL_MISS_TTL = 600
+# Follow-up actions (reactions) running at once, apart from the sends.
+MAX_PARALLEL_FOLLOW_UPS = 2
+
+
+async def _send_with_retry(send, target, metrics=None):
+    for attempt in range(SEND_ATTEMPTS):
+        try:
+            return await send(target)
+        except discord.HTTPException as e:
+            if e.status != 429 or attempt + 1 == SEND_ATTEMPTS:
+                raise
+            if metrics is not None:
+                metrics.inc("send_retries_total")
+            retry_after = getattr(e, "retry_after", None) or 2 ** attempt
+            await asyncio.sleep(retry_after)
+
+
+async def fan_out(targets, send, concurrency=MAX_PARALLEL_SENDS, metrics=None):
+    """Run ``send(target)`` for every target with bounded parallelism.
+
+    Rate-limited sends are retried after Discord's ``retry_after``. Returns
+    one result per target, in order; failures are returned as exceptions
+    rather than raised, so one bad channel never stops the others. Retries
+    are counted in ``metrics`` when given.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one(target):
+        async with semaphore:
+            return await _send_with_retry(send, target, metrics)
+
+    return await asyncio.gather(*(_one(target) for target in targets), return_exceptions=True)
+
+
+class Delivery:
+    """Channel resolution and sending for a cog's scheduled posts.
+
+    Channels come from the gateway cache when it has them; otherwise they
+    are fetched over REST once and memoised for ``CHANNEL_MEMO_TTL``, with
+    concurrent lookups of the same channel sharing one request. Channels
+    that don't exist or can't be seen are remembered as missing for
+    ``CHANNEL_MISS_TTL``.
+
+    Follow-up actions such as reactions are started with ``follow_up``.
+    They run in the background on ``spawn`` (the cog's task tracker), so
+    the next send never waits for them. A small semaphore caps how many run
+    at once, and rate-limited ones are retried after ``retry_after`` like
+    the sends.
+    """
+
+    def __init__(self, bot, spawn, metrics=None, concurrency=MAX_PARALLEL_SENDS):
+        self.bot = bot
+        self.spawn = spawn
+        self.metrics = metrics
+        self.concurrency = concurrency
+        # channel id -> (channel or None, monotonic expiry)
+        self._channels = {}
+        self._fetches = SingleFlight()
+        self._follow_ups = asyncio.Semaphore(MAX_PARALLEL_FOLLOW_UPS)
+
+    def _count(self, source):
+        if self.metrics is not None:
+            self.metrics.inc("channel_resolve_total", source=source)
+
+    async def channel(self, channel_id):
+        """The channel with ``channel_id``, or ``None`` if it is gone or hidden from the bot."""
+        channel = self.bot.get_channel(channel_id)
+        if channel is not None:
+            self._count("cache")
+            return channel
+
+        memo = self._channels.get(channel_id)
+        if memo is not None and memo[1] > time.monotonic():
+            self._count("memo" if memo[0] is not None else "missing")
+            return memo[0]
+
+        return await self._fetches.do(channel_id, lambda: self._fetch(channel_id))
+
+    async def _fetch(self, channel_id):
+        try:
+            channel = await _send_with_retry(self.bot.fetch_channel, channel_id, self.metrics)
+        except (discord.NotFound, discord.Forbidden):
+            self._count("missing")
+            self._channels[channel_id] = (None, time.monotonic() + CHANNEL_MISS_TTL)
+            return None
+
+        self._count("rest")
+        self._channels[channel_id] = (channel, time.monotonic() + CHANNEL_MEMO_TTL)
+        return channel
+
+    def forget(self, channel_id):
+        self._channels.pop(channel_id, None)
+
+    async def fan_out(self, channel_ids, send):
+        """Resolve each channel and run ``send(channel)`` on it, as ``fan_out`` does.
+
+        Channels that can't be resolved give a ``LookupError`` result.
+        """
+
+        async def _send(channel_id):
+            channel = await self.channel(channel_id)
+            if channel is None:
+                raise LookupError(f"channel {channel_id} not found")
+            try:
+                return await send(channel)
+            except (discord.NotFound, discord.Forbidden):
+                # Deleted or locked since it was resolved; look it up again next time.
+                self.forget(channel_id)
+                raise
+
+        return await fan_out(channel_ids, _send, self.concurrency, self.metrics)
+
+    def follow_up(self, func, *args, name=None):
+        """Run ``await func(*args)`` in the background, off the send path."""
+
+        async def _run():
+            async with self._follow_ups:
+                try:
+                    await _send_with_retry(lambda _: func(*args), None, self.metrics)
+                except discord.HTTPException as e:
+                    print(f"Follow-up {name or func} failed: {e}")
+
+        return self.spawn(_run(), name=name)
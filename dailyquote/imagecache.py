@@ -0,0 +1,247 @@
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+
+# Bytes of file contents kept in the in-memory tier.
+HOT_TIER_BYTES = 32 * 1024 * 1024
+
+
+def cache_key(*parts):
+    """Stable hash of every input that affects a generated image."""
+    hasher = hashlib.sha256()
+    for part in parts:
+        encoded = str(part).encode("utf-8")
+        # Length-prefix each part so ("ab", "c") != ("a", "bc").
+        hasher.update(f"{len(encoded)}:".encode("ascii"))
+        hasher.update(encoded)
+    return hasher.hexdigest()
+
+
+class MemoryTier:
+    """Size-bounded LRU of file contents, keyed by path.
+
+    Entries are trusted until ``forget``/``clear``; whoever replaces a
+    file in place must drop it here.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total = 0
+        # Used from the event loop and from cache worker threads.
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            data = self.entries.get(path)
+            if data is not None:
+                self.entries.move_to_end(path)
+            return data
+
+    def put(self, path, data):
+        # Don't let one large file flush everything else.
+        if len(data) > self.max_bytes // 4:
+            return
+        with self._lock:
+            self._drop(path)
+            self.entries[path] = data
+            self.total += len(data)
+            while self.total > self.max_bytes:
+                _, dropped = self.entries.popitem(last=False)
+                self.total -= len(dropped)
+
+    def _drop(self, path):
+        data = self.entries.pop(path, None)
+        if data is not None:
+            self.total -= len(data)
+
+    def forget(self, prefix):
+        """Drop ``prefix`` and every cached path starting with it."""
+        with self._lock:
+            for path in [path for path in self.entries if path.startswith(prefix)]:
+                self._drop(path)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.total = 0
+
+
+def _link_or_copy(source, target):
+    # A hard link costs no space or copying when both are on one disk.
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _read_file(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+class ImageCache:
+    """Content-addressed image cache with a size-bounded LRU policy.
+
+    Entries live in ``directory`` as ``<key><ext>`` and are tracked in
+    ``manifest.json`` together with their size, last use time and a bit of
+    free-form metadata. When the total size goes over ``max_bytes`` the
+    least recently used entries are evicted.
+
+    The plain methods do blocking file I/O; the async ones (``load``,
+    ``lookup``, ``store``, ``copy_to``, ``read``, ``flush``) run it in a
+    thread. ``read`` serves recently used files from an in-memory tier of
+    ``memory_bytes``, so hot reads never touch the disk.
+    """
+
+    def __init__(self, directory, max_bytes, memory_bytes=HOT_TIER_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self._manifest = None
+        # Last-use updates are saved with the next write or ``flush``.
+        self._dirty = False
+        self._lock = threading.RLock()
+        self.hot = MemoryTier(memory_bytes)
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as file:
+                    self._manifest = json.load(file)
+            except (OSError, ValueError):
+                self._manifest = {}
+        return self._manifest
+
+    def _save_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._dirty = False
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.manifest, file, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def path_for(self, key, extension=None):
+        if extension is None:
+            extension = self.manifest.get(key, {}).get("ext", ".png")
+        return os.path.join(self.directory, f"{key}{extension}")
+
+    def get_path(self, key):
+        """Return the path of the cached file for ``key`` or ``None``.
+
+        Marks the entry as recently used. Callers stream from the file
+        instead of loading it into memory.
+        """
+        with self._lock:
+            if key not in self.manifest:
+                return None
+            path = self.path_for(key)
+            if not os.path.exists(path):
+                del self.manifest[key]
+                self._save_manifest()
+                return None
+            self.manifest[key]["last_used"] = time.time()
+            self._dirty = True
+            return path
+
+    def temp_path_for(self, key):
+        """Scratch path to write a new entry to before ``put_file``.
+
+        The directory is created by ``load``.
+        """
+        return os.path.join(self.directory, f"{key}.tmp")
+
+    def put_file(self, key, tmp_path, meta=None, extension=".png"):
+        """Atomically move a fully written file into the cache."""
+        with self._lock:
+            path = self.path_for(key, extension)
+            os.replace(tmp_path, path)
+            self.hot.forget(os.path.join(self.directory, key))
+            self.manifest[key] = {
+                "ext": extension,
+                "size": os.path.getsize(path),
+                "last_used": time.time(),
+                "meta": meta or {},
+            }
+            self.evict()
+            self._save_manifest()
+            return path
+
+    def total_bytes(self):
+        return sum(entry["size"] for entry in self.manifest.values())
+
+    def evict(self):
+        """Drop least recently used entries until under ``max_bytes``."""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+
+        by_age = sorted(self.manifest.items(), key=lambda item: item[1]["last_used"])
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            self.hot.forget(os.path.join(self.directory, key))
+            # The image plus any derived variants stored next to it.
+            for path in glob.glob(os.path.join(self.directory, f"{key}.*")):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            del self.manifest[key]
+            total -= entry["size"]
+
+    async def load(self):
+        """Create the directory and read the manifest off the event loop."""
+        def _load():
+            os.makedirs(self.directory, exist_ok=True)
+            return len(self.manifest)
+
+        return await asyncio.to_thread(_load)
+
+    async def lookup(self, key):
+        """Async ``get_path``; answered from memory for hot entries."""
+        manifest = self._manifest
+        if manifest is not None and key in manifest:
+            path = self.path_for(key)
+            if self.hot.get(path) is not None:
+                manifest[key]["last_used"] = time.time()
+                self._dirty = True
+                return path
+        return await asyncio.to_thread(self.get_path, key)
+
+    async def store(self, key, tmp_path, meta=None, extension=".png"):
+        return await asyncio.to_thread(self.put_file, key, tmp_path, meta, extension)
+
+    async def copy_to(self, path, target):
+        """Put a copy (a hard link where possible) of a cached file at ``target``."""
+        def _copy():
+            if os.path.exists(target):
+                os.remove(target)
+            _link_or_copy(path, target)
+
+        await asyncio.to_thread(_copy)
+
+    async def read(self, path):
+        """Contents of ``path`` (in or outside the cache), kept in the memory tier."""
+        data = self.hot.get(path)
+        if data is None:
+            data = await asyncio.to_thread(_read_file, path)
+            self.hot.put(path, data)
+        return data
+
+    async def flush(self):
+        """Save pending last-use updates."""
+        if self._dirty:
+            def _flush():
+                with self._lock:
+                    self._save_manifest()
+
+            await asyncio.to_thread(_flush)
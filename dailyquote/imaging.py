@@ -0,0 +1,114 @@
+import os
+
+
+# Default upload budget; comfortably under Discord's smallest guild upload limit.
+UPLOAD_MAX_BYTES = 4 * 1024 * 1024
+UPLOAD_QUALITIES = (90, 82, 74, 66, 58, 50)
+# Each downscale step shrinks both sides to this fraction.
+DOWNSCALE_STEP = 0.85
+MIN_SIDE = 512
+
+# Output options accepted by the gpt-image models.
+IMAGE_SIZES = ("1024x1024", "1536x1024", "1024x1536", "auto")
+IMAGE_QUALITIES = ("low", "medium", "high", "auto")
+IMAGE_FORMATS = ("png", "jpeg", "webp")
+FORMAT_EXTENSIONS = {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}
+
+
+# (Image, features) once Pillow was imported, False if it isn't installed.
+_pil = None
+
+
+def load_pil():
+    """Import Pillow on first use. Returns ``(Image, features)`` or ``None``."""
+    global _pil
+    if _pil is None:
+        try:
+            from PIL import Image, features
+        except ImportError:  # Pillow is optional; without it images are uploaded as generated.
+            _pil = False
+        else:
+            _pil = (Image, features)
+    return _pil or None
+
+
+def upload_format():
+    """The smallest format Pillow can write here: WebP if available, else JPEG."""
+    pil = load_pil()
+    if pil is not None and pil[1].check("webp"):
+        return "WEBP", ".webp"
+    return "JPEG", ".jpg"
+
+
+def variant_path(original_path, extension):
+    root, _ = os.path.splitext(original_path)
+    return f"{root}.upload{extension}"
+
+
+def existing_variant(original_path):
+    """The compressed variant of ``original_path`` if it is already on disk."""
+    if load_pil() is None:
+        return None
+    path = variant_path(original_path, upload_format()[1])
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(original_path):
+        return path
+    return None
+
+
+def _encode(image, target_path, image_format, quality):
+    tmp_path = f"{target_path}.tmp"
+    options = {"quality": quality}
+    if image_format == "WEBP":
+        options["method"] = 4
+    else:
+        options["optimize"] = True
+        options["progressive"] = True
+    image.save(tmp_path, image_format, **options)
+    return tmp_path, os.path.getsize(tmp_path)
+
+
+def compress_for_upload(original_path, max_bytes=UPLOAD_MAX_BYTES):
+    """Re-encode an image to fit ``max_bytes`` and store it next to the original.
+
+    Tries decreasing qualities, then smaller sizes, until the encoded file
+    fits. The variant is kept as ``<name>.upload.webp`` (or ``.jpg``) and
+    reused while it is newer than the original. Returns the path to upload:
+    the variant, or the original when re-encoding doesn't make it smaller or
+    Pillow is not installed. Blocking; run it off the event loop.
+    """
+    pil = load_pil()
+    if pil is None:
+        return original_path
+    Image = pil[0]
+
+    cached = existing_variant(original_path)
+    if cached and os.path.getsize(cached) <= max_bytes:
+        return cached
+
+    image_format, extension = upload_format()
+    target_path = variant_path(original_path, extension)
+
+    with Image.open(original_path) as source:
+        image = source.convert("RGB")
+
+    tmp_path = None
+    while True:
+        for quality in UPLOAD_QUALITIES:
+            tmp_path, size = _encode(image, target_path, image_format, quality)
+            if size <= max_bytes:
+                break
+        if size <= max_bytes or min(image.size) <= MIN_SIDE:
+            break
+        width, height = image.size
+        image = image.resize(
+            (int(width * DOWNSCALE_STEP), int(height * DOWNSCALE_STEP)),
+            Image.LANCZOS,
+        )
+
+    if size >= os.path.getsize(original_path):
+        # Re-encoding didn't help; upload the original as is.
+        os.remove(tmp_path)
+        return original_path
+
+    os.replace(tmp_path, target_path)
+    return target_path
@@ -0,0 +1,159 @@
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+# Recent samples kept per histogram for the percentile estimates.
+WINDOW = 500
+QUANTILES = (0.5, 0.95)
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return None
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Histogram:
+    """Latency distribution: lifetime count and sum plus a window of recent samples."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=WINDOW)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.recent.append(value)
+
+    def quantiles(self):
+        ordered = sorted(self.recent)
+        return {fraction: _percentile(ordered, fraction) for fraction in QUANTILES}
+
+
+class Metrics:
+    """In-process counters and latency histograms for one cog.
+
+    Series are keyed by name plus ``key=value`` labels. ``stage`` times a
+    block of the posting pipeline and counts its failures by exception
+    class. Everything lives in memory; ``export`` writes a snapshot as JSON
+    (``.json`` paths) or in the Prometheus text format (anything else).
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.counters = {}
+        self.histograms = {}
+        self.started_at = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def stage(self, stage):
+        """Time the block as ``stage_seconds{stage=...}``; count errors by class."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.inc("errors_total", stage=stage, error=type(e).__name__)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - started, stage=stage)
+
+    def summary(self):
+        """``(latency rows, counter rows)`` for display, sorted by series."""
+        latencies = []
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            quantiles = histogram.quantiles()
+            latencies.append((name, dict(labels), histogram.count, quantiles[0.5], quantiles[0.95]))
+        counters = [(name, dict(labels), value) for (name, labels), value in sorted(self.counters.items())]
+        return latencies, counters
+
+    def to_json(self):
+        latencies, counters = self.summary()
+        return {
+            "namespace": self.namespace,
+            "started_at": self.started_at,
+            "histograms": [
+                {"name": name, "labels": labels, "count": count, "p50": p50, "p95": p95}
+                for name, labels, count, p50, p95 in latencies
+            ],
+            "counters": [
+                {"name": name, "labels": labels, "value": value} for name, labels, value in counters
+            ],
+        }
+
+    def to_prometheus(self):
+        lines = []
+        typed = set()
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            metric = f"{self.namespace}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} summary")
+                typed.add(metric)
+            for fraction, value in histogram.quantiles().items():
+                if value is not None:
+                    lines.append(f"{metric}{_label_text(labels + (('quantile', str(fraction)),))} {value}")
+            lines.append(f"{metric}_sum{_label_text(labels)} {histogram.total}")
+            lines.append(f"{metric}_count{_label_text(labels)} {histogram.count}")
+
+        for (name, labels), value in sorted(self.counters.items()):
+            metric = f"{self.namespace}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Write a snapshot to ``path`` atomically. Blocking; run it off the event loop."""
+        if path.endswith(".json"):
+            content = json.dumps(self.to_json(), indent=1)
+        else:
+            content = self.to_prometheus()
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+
+
+def format_summary(metrics):
+    """Plain-text table of ``metrics`` for a Discord code block."""
+    latencies, counters = metrics.summary()
+    lines = []
+    if latencies:
+        lines.append(f"{'stage':<24}{'n':>6}{'p50 s':>9}{'p95 s':>9}")
+        for name, labels, count, p50, p95 in latencies:
+            label = labels.get("stage", name)
+            lines.append(f"{label:<24}{count:>6}{p50:>9.2f}{p95:>9.2f}")
+    if counters:
+        if lines:
+            lines.append("")
+        for name, labels, value in counters:
+            label = name + _label_text(tuple(labels.items()))
+            lines.append(f"{label:<48}{value:>10}")
+    return "\n".join(lines) or "No data yet."
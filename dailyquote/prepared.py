@@ -0,0 +1,118 @@
+import glob
+import json
+import os
+import time
+
+from .imaging import existing_variant, variant_path
+
+
+class PreparedQuoteStore:
+    """On-disk slot holding a quote and its already rendered image.
+
+    The quote is stored as ``<name>.json`` and the image as ``<name>.<ext>``
+    in ``directory``. Both are written through a temporary file and
+    ``os.replace`` so a crash never leaves a half-written entry. All methods
+    do blocking file I/O and are meant to run off the event loop.
+    """
+
+    def __init__(self, directory, name="next_quote"):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, f"{name}.json")
+        self.image_stem = os.path.join(directory, name)
+
+    def load(self):
+        """Return the prepared quote dict, or ``None`` if nothing is prepared.
+
+        The returned dict has ``quote``, ``author``, ``image_path`` (which
+        is ``None`` when the image could not be generated), ``upload_path``,
+        the compressed variant when there is one, and ``day``, the date the
+        quote was posted for (if any).
+        """
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if not data.get("quote"):
+            return None
+
+        image_file = data.get("image_file")
+        image_path = os.path.join(self.directory, image_file) if image_file else None
+        if image_path and not os.path.exists(image_path):
+            image_path = None
+
+        return {
+            "quote": data["quote"],
+            "author": data.get("author", ""),
+            "image_path": image_path,
+            "upload_path": image_path and (existing_variant(image_path) or image_path),
+            "prepared_at": data.get("prepared_at"),
+            "day": data.get("day"),
+        }
+
+    @property
+    def image_tmp_path(self):
+        """Where a new image is written before ``save`` moves it into place."""
+        os.makedirs(self.directory, exist_ok=True)
+        return f"{self.image_stem}.tmp"
+
+    def _write_meta(self, quote, image_path, day):
+        data = {
+            "quote": quote["quote"],
+            "author": quote["author"],
+            "image_file": os.path.basename(image_path) if image_path else None,
+            "prepared_at": time.time(),
+            "day": day,
+        }
+        tmp_meta = f"{self.meta_path}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(tmp_meta, self.meta_path)
+
+    def save(self, quote, has_image, extension=".png", day=None):
+        """Store ``quote``, moving the image at ``image_tmp_path`` into place.
+
+        Returns the final image path, or ``None`` without an image.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        image_path = None
+        if has_image:
+            image_path = f"{self.image_stem}{extension}"
+            os.replace(self.image_tmp_path, image_path)
+
+        self._write_meta(quote, image_path, day)
+        return image_path
+
+    def move_to(self, other, day=None):
+        """Move this slot's quote, image and compressed variant into ``other``.
+
+        Returns ``other``'s loaded entry, or ``None`` if this slot was empty.
+        """
+        entry = self.load()
+        if entry is None:
+            return None
+
+        other.discard()
+        os.makedirs(other.directory, exist_ok=True)
+
+        image_path = None
+        if entry["image_path"]:
+            image_path = other.image_stem + os.path.splitext(entry["image_path"])[1]
+            os.replace(entry["image_path"], image_path)
+            if entry["upload_path"] != entry["image_path"]:
+                upload_extension = os.path.splitext(entry["upload_path"])[1]
+                os.replace(entry["upload_path"], variant_path(image_path, upload_extension))
+
+        other._write_meta(entry, image_path, day)
+        self.discard()
+        return other.load()
+
+    def discard(self):
+        # The meta file, the image and any compressed variants of it.
+        for path in glob.glob(f"{self.image_stem}.*"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,295 @@
+import csv
+import hashlib
+import io
+import os
+import random
+import secrets
+import struct
+
+
+INDEX_MAGIC = b"DQIDX001"
+# magic, csv size, csv mtime (ns), number of rows
+INDEX_HEADER = struct.Struct("<8sQqQ")
+OFFSET = struct.Struct("<Q")
+FEISTEL_ROUNDS = 4
+
+
+class QuoteFilter:
+    """Category include/exclude filter applied to a parsed CSV row.
+
+    Tags are matched case-insensitively against the row's category column.
+    A row passes when it matches none of ``exclude`` and, if ``include`` is
+    non-empty, at least one of ``include``.
+    """
+
+    def __init__(self, include=(), exclude=()):
+        self.include = frozenset(tag.strip().lower() for tag in include if tag.strip())
+        self.exclude = frozenset(tag.strip().lower() for tag in exclude if tag.strip())
+
+    def __call__(self, row):
+        if len(row) < 3:
+            return False
+
+        categories = row[2].lower()
+        if any(tag in categories for tag in self.exclude):
+            return False
+        if self.include and not any(tag in categories for tag in self.include):
+            return False
+        return True
+
+    def __eq__(self, other):
+        if not isinstance(other, QuoteFilter):
+            return NotImplemented
+        return (self.include, self.exclude) == (other.include, other.exclude)
+
+    def __hash__(self):
+        return hash((self.include, self.exclude))
+
+    def __repr__(self):
+        return f"QuoteFilter(include={sorted(self.include)}, exclude={sorted(self.exclude)})"
+
+    def with_tags(self, include=(), exclude=()):
+        return QuoteFilter(self.include | set(include), self.exclude | set(exclude))
+
+
+# The filter the daily quote has always used: no romance quotes.
+DEFAULT_FILTER = QuoteFilter(exclude=("romance",))
+
+
+def iter_records(file):
+    """Yield ``(offset, raw_bytes)`` for every CSV record in a binary file.
+
+    A record ends on a newline outside of a quoted field, so multi-line
+    quotes are kept together. Offsets are byte positions, suitable for
+    ``seek``.
+    """
+    offset = 0
+    start = 0
+    parts = []
+    quotes = 0
+
+    for line in file:
+        if not parts:
+            start = offset
+        parts.append(line)
+        quotes += line.count(b'"')
+        offset += len(line)
+
+        if quotes % 2 == 0:
+            yield start, b"".join(parts)
+            parts = []
+            quotes = 0
+
+    if parts:
+        yield start, b"".join(parts)
+
+
+def parse_record(raw):
+    """Parse one raw CSV record into a list of fields."""
+    text = raw.decode("utf-8", errors="replace")
+    try:
+        return next(csv.reader(io.StringIO(text)))
+    except (StopIteration, csv.Error):
+        return []
+
+
+def is_header(row):
+    return bool(row) and row[0].strip().lower() == "quote"
+
+
+def row_to_quote(row):
+    return {"quote": row[0], "author": row[1]}
+
+
+def sample_quote(csv_path, quote_filter, rng=random):
+    """Pick one quote matching ``quote_filter`` in a single streaming pass.
+
+    Uses reservoir sampling, so every matching row is equally likely and
+    memory stays constant no matter how large the corpus or how loose the
+    filter is.
+    """
+    chosen = None
+    seen = 0
+
+    with open(csv_path, "rb") as file:
+        for offset, raw in iter_records(file):
+            row = parse_record(raw)
+            if offset == 0 and is_header(row):
+                continue
+            if not quote_filter(row):
+                continue
+
+            seen += 1
+            if rng.randrange(seen) == 0:
+                chosen = row
+
+    return row_to_quote(chosen) if chosen else None
+
+
+class Rotation:
+    """Visits every position in ``range(size)`` once, in random order, before repeating.
+
+    The order is a keyed pseudorandom permutation (a small Feistel network
+    with cycle-walking), so the whole state is the key, the pool size and a
+    cursor: a few dozen bytes regardless of the corpus size, and each step
+    is O(1). A new key is drawn when a cycle ends or the pool size changes.
+    """
+
+    def __init__(self, size=0, key=None, cursor=0):
+        self.size = size
+        self.key = key or secrets.token_bytes(16)
+        self.cursor = cursor
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return cls()
+        return cls(data["size"], bytes.fromhex(data["key"]), data["cursor"])
+
+    def to_dict(self):
+        return {"size": self.size, "key": self.key.hex(), "cursor": self.cursor}
+
+    @property
+    def remaining(self):
+        return max(self.size - self.cursor, 0)
+
+    def _round(self, value, round_number, mask):
+        digest = hashlib.blake2b(
+            value.to_bytes(8, "little") + bytes((round_number,)), key=self.key, digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "little") & mask
+
+    def permute(self, index):
+        """Position ``index`` of the current cycle maps to."""
+        half = max((self.size - 1).bit_length() + 1, 2) // 2
+        mask = (1 << half) - 1
+
+        value = index
+        while True:
+            left, right = value >> half, value & mask
+            for round_number in range(FEISTEL_ROUNDS):
+                left, right = right, left ^ self._round(right, round_number, mask)
+            value = (left << half) | right
+            # The permuted domain is at most 4x the pool; walk until we land in it.
+            if value < self.size:
+                return value
+
+    def next(self, size):
+        """The next unused position of a pool of ``size``, or ``None`` if empty."""
+        if size <= 0:
+            return None
+        if size != self.size or self.cursor >= self.size:
+            self.size = size
+            self.key = secrets.token_bytes(16)
+            self.cursor = 0
+
+        position = self.permute(self.cursor)
+        self.cursor += 1
+        return position
+
+
+class QuoteIndex:
+    """Persistent byte-offset table of the ``DEFAULT_FILTER`` rows in ``quotes.csv``.
+
+    The index is a small binary file next to the CSV holding one 8-byte
+    offset per eligible row. It is built once and rebuilt only when the
+    CSV's size or mtime changes, so picking a quote is a couple of seeks
+    instead of a full parse of the corpus.
+    """
+
+    def __init__(self, csv_path, index_path=None):
+        self.csv_path = csv_path
+        self.index_path = index_path or f"{csv_path}.idx"
+
+    def _csv_signature(self):
+        stat = os.stat(self.csv_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _read_header(self):
+        try:
+            with open(self.index_path, "rb") as file:
+                header = file.read(INDEX_HEADER.size)
+        except OSError:
+            return None
+
+        if len(header) != INDEX_HEADER.size:
+            return None
+
+        magic, size, mtime_ns, count = INDEX_HEADER.unpack(header)
+        if magic != INDEX_MAGIC:
+            return None
+
+        return size, mtime_ns, count
+
+    def is_fresh(self):
+        header = self._read_header()
+        if header is None:
+            return False
+
+        size, mtime_ns, _ = header
+        return (size, mtime_ns) == self._csv_signature()
+
+    def build(self):
+        """Scan the CSV once and write the offset table. Returns the row count."""
+        size, mtime_ns = self._csv_signature()
+        tmp_path = f"{self.index_path}.tmp"
+        count = 0
+
+        with open(self.csv_path, "rb") as source, open(tmp_path, "wb") as out:
+            out.write(INDEX_HEADER.pack(INDEX_MAGIC, size, mtime_ns, 0))
+
+            for offset, raw in iter_records(source):
+                row = parse_record(raw)
+                if offset == 0 and is_header(row):
+                    continue
+                if DEFAULT_FILTER(row):
+                    out.write(OFFSET.pack(offset))
+                    count += 1
+
+            out.seek(0)
+            out.write(INDEX_HEADER.pack(INDEX_MAGIC, size, mtime_ns, count))
+
+        os.replace(tmp_path, self.index_path)
+        return count
+
+    def ensure(self):
+        """Make sure the index matches the CSV, rebuilding it if needed."""
+        header = self._read_header()
+        if header is not None and header[:2] == self._csv_signature():
+            return header[2]
+
+        print("Building quote index")
+        count = self.build()
+        print(f"Quote index built: {count} quotes")
+        return count
+
+    def __len__(self):
+        header = self._read_header()
+        return header[2] if header else 0
+
+    def offset_at(self, position):
+        with open(self.index_path, "rb") as file:
+            file.seek(INDEX_HEADER.size + position * OFFSET.size)
+            (offset,) = OFFSET.unpack(file.read(OFFSET.size))
+        return offset
+
+    def read_at(self, offset):
+        """Read and parse the single CSV record starting at ``offset``."""
+        with open(self.csv_path, "rb") as file:
+            file.seek(offset)
+            for _, raw in iter_records(file):
+                return parse_record(raw)
+        return []
+
+    def quote_at(self, position):
+        row = self.read_at(self.offset_at(position))
+        if len(row) < 2:
+            return None
+        return row_to_quote(row)
+
+    def pick_next(self, rotation):
+        """Return the next quote of ``rotation``, never repeating within a cycle."""
+        position = rotation.next(self.ensure())
+        if position is None:
+            return None
+        return self.quote_at(position)
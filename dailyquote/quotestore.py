@@ -0,0 +1,335 @@
+import csv
+import hashlib
+import io
+import os
+import random
+import sqlite3
+import threading
+
+from .quoteindex import is_header
+
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE quotes (
+    id INTEGER PRIMARY KEY,
+    quote TEXT NOT NULL,
+    author TEXT NOT NULL,
+    author_key TEXT NOT NULL
+);
+CREATE INDEX quotes_author ON quotes (author_key);
+CREATE TABLE tags (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE quote_tags (
+    quote_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    PRIMARY KEY (quote_id, tag_id)
+) WITHOUT ROWID;
+CREATE INDEX quote_tags_tag ON quote_tags (tag_id, quote_id);
+CREATE VIRTUAL TABLE quotes_fts USING fts5(quote, author, content='quotes', content_rowid='id');
+"""
+
+# Rows inserted per transaction batch while importing.
+IMPORT_BATCH = 5000
+# Bytes at the end of the imported CSV that must be unchanged for an append-only update.
+TAIL_CHECK_BYTES = 64 * 1024
+# Random ids tried before a filtered pick falls back to an exact query.
+PICK_ATTEMPTS = 64
+# Rotation steps tried for a quote matching the filter before picking at random.
+ROTATION_ATTEMPTS = 4096
+
+
+def split_tags(categories):
+    """The normalised tag names of a CSV category column."""
+    return {tag.strip().lower() for tag in categories.split(",") if tag.strip()}
+
+
+def _tail_hash(path, size):
+    with open(path, "rb") as file:
+        file.seek(max(size - TAIL_CHECK_BYTES, 0))
+        return hashlib.sha256(file.read(min(size, TAIL_CHECK_BYTES))).hexdigest()
+
+
+class QuoteStore:
+    """SQLite copy of ``quotes.csv`` with interned tags and a full-text index.
+
+    Created once by ``build`` (the ``import_quotes`` command) and then kept in
+    sync by ``refresh``: rows appended to the CSV are imported in place, any
+    other change rebuilds the database into a temporary file and swaps it in.
+    Quote ids are contiguous from 1, so a random pick is a primary-key
+    lookup. All methods block and are meant to run off the event loop;
+    each thread gets its own connection. Rebuilds never touch the live file,
+    so lookups keep working on the old copy until the new one is swapped in.
+    """
+
+    def __init__(self, db_path, csv_path):
+        self.db_path = db_path
+        self.csv_path = csv_path
+        self._local = threading.local()
+        # Bumped on every rebuild so threads reopen the swapped-in file.
+        self._generation = 0
+        # QuoteFilter -> (include tag ids, exclude tag ids), reset on every import.
+        self._filter_tags = {}
+
+    def exists(self):
+        return os.path.exists(self.db_path)
+
+    @property
+    def conn(self):
+        local = self._local
+        if getattr(local, "generation", None) != self._generation:
+            self.close()
+            local.conn = sqlite3.connect(self.db_path)
+            local.generation = self._generation
+        return local.conn
+
+    def close(self):
+        """Close the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+            self._local.generation = None
+
+    def _meta(self, conn, key):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _csv_signature(self):
+        stat = os.stat(self.csv_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def build(self):
+        """Import the whole CSV into a fresh database. Returns the number of quotes."""
+        tmp_path = f"{self.db_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.executescript(SCHEMA)
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            count = self._import_from(conn, 0)
+        finally:
+            conn.close()
+
+        os.replace(tmp_path, self.db_path)
+        self._generation += 1
+        return count
+
+    def refresh(self):
+        """Bring the database up to date with the CSV. Returns the number of new quotes."""
+        conn = self.conn
+        size, mtime_ns = self._csv_signature()
+        old_size = self._meta(conn, "csv_size")
+        if (old_size, self._meta(conn, "csv_mtime_ns")) == (size, mtime_ns):
+            return 0
+
+        appended = (
+            old_size is not None
+            and size > old_size
+            and self._meta(conn, "clean_end")
+            and self._meta(conn, "tail_hash") == _tail_hash(self.csv_path, old_size)
+        )
+        if not appended:
+            print("quotes.csv changed, rebuilding the quote store")
+            return self.build()
+
+        with conn:
+            count = self._import_from(conn, old_size)
+        return count
+
+    def _import_from(self, conn, offset):
+        size, mtime_ns = self._csv_signature()
+        tag_ids = dict(conn.execute("SELECT name, id FROM tags"))
+        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM quotes").fetchone()[0] + 1
+        first_id = next_id
+        quotes, quote_tags = [], []
+
+        def flush():
+            conn.executemany("INSERT INTO quotes VALUES (?, ?, ?, ?)", quotes)
+            conn.executemany(
+                "INSERT INTO quotes_fts (rowid, quote, author) VALUES (?, ?, ?)",
+                [row[:3] for row in quotes],
+            )
+            conn.executemany("INSERT OR IGNORE INTO quote_tags VALUES (?, ?)", quote_tags)
+            quotes.clear()
+            quote_tags.clear()
+
+        with open(self.csv_path, "rb") as raw:
+            raw.seek(offset)
+            # Only read what the signature covers; later appends wait for the next refresh.
+            text = io.TextIOWrapper(io.BufferedReader(_Limited(raw, size - offset)),
+                                    encoding="utf-8", errors="replace", newline="")
+            for row in csv.reader(text):
+                if offset == 0 and next_id == first_id and is_header(row):
+                    continue
+                if len(row) < 2:
+                    continue
+
+                quote_id = next_id
+                next_id += 1
+                quotes.append((quote_id, row[0], row[1], row[1].strip().lower()))
+                for tag in split_tags(row[2]) if len(row) > 2 else ():
+                    tag_id = tag_ids.get(tag)
+                    if tag_id is None:
+                        tag_id = conn.execute("INSERT INTO tags (name) VALUES (?)", (tag,)).lastrowid
+                        tag_ids[tag] = tag_id
+                    quote_tags.append((quote_id, tag_id))
+
+                if len(quotes) >= IMPORT_BATCH:
+                    flush()
+        flush()
+
+        with open(self.csv_path, "rb") as file:
+            file.seek(max(size - 1, 0))
+            clean_end = size == 0 or file.read(1) == b"\n"
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+            [
+                ("csv_size", size),
+                ("csv_mtime_ns", mtime_ns),
+                ("tail_hash", _tail_hash(self.csv_path, size)),
+                ("clean_end", int(clean_end)),
+            ],
+        )
+        conn.commit()
+        self._filter_tags.clear()
+        return next_id - first_id
+
+    def __len__(self):
+        return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM quotes").fetchone()[0]
+
+    def _tag_ids(self, quote_filter):
+        cached = self._filter_tags.get(quote_filter)
+        if cached is None:
+            # Tags match by substring, like QuoteFilter does on the raw column.
+            def matching(tags):
+                ids = set()
+                for tag in tags:
+                    ids.update(row[0] for row in self.conn.execute(
+                        "SELECT id FROM tags WHERE instr(name, ?) > 0", (tag,)
+                    ))
+                return frozenset(ids)
+
+            cached = (matching(quote_filter.include), matching(quote_filter.exclude))
+            self._filter_tags[quote_filter] = cached
+        return cached
+
+    def _accepts(self, quote_id, include_ids, exclude_ids, has_include):
+        tags = {row[0] for row in self.conn.execute(
+            "SELECT tag_id FROM quote_tags WHERE quote_id = ?", (quote_id,)
+        )}
+        if tags & exclude_ids:
+            return False
+        return not has_include or bool(tags & include_ids)
+
+    def quote(self, quote_id):
+        row = self.conn.execute(
+            "SELECT quote, author FROM quotes WHERE id = ?", (quote_id,)
+        ).fetchone()
+        return {"quote": row[0], "author": row[1]} if row else None
+
+    def pick(self, quote_filter, rng=random):
+        """A random quote matching ``quote_filter``, or ``None`` if none does."""
+        total = len(self)
+        if not total:
+            return None
+
+        include_ids, exclude_ids = self._tag_ids(quote_filter)
+        has_include = bool(quote_filter.include)
+        for _ in range(PICK_ATTEMPTS):
+            quote_id = rng.randrange(total) + 1
+            if self._accepts(quote_id, include_ids, exclude_ids, has_include):
+                return self.quote(quote_id)
+
+        # Narrow filter: count the matches and jump to one of them.
+        conditions, params = [], []
+        if has_include:
+            marks = ",".join("?" * len(include_ids))
+            conditions.append(f"id IN (SELECT quote_id FROM quote_tags WHERE tag_id IN ({marks}))")
+            params.extend(include_ids)
+        if exclude_ids:
+            marks = ",".join("?" * len(exclude_ids))
+            conditions.append(f"id NOT IN (SELECT quote_id FROM quote_tags WHERE tag_id IN ({marks}))")
+            params.extend(exclude_ids)
+        where = " AND ".join(conditions) or "1"
+
+        matches = self.conn.execute(f"SELECT COUNT(*) FROM quotes WHERE {where}", params).fetchone()[0]
+        if not matches:
+            return None
+        row = self.conn.execute(
+            f"SELECT id FROM quotes WHERE {where} LIMIT 1 OFFSET ?", (*params, rng.randrange(matches))
+        ).fetchone()
+        return self.quote(row[0])
+
+    def pick_next(self, rotation, quote_filter):
+        """The next quote of ``rotation`` that matches ``quote_filter``.
+
+        The rotation runs over every quote id; ids the filter rejects are
+        stepped over, so no matching quote repeats within a cycle.
+        """
+        total = len(self)
+        include_ids, exclude_ids = self._tag_ids(quote_filter)
+        has_include = bool(quote_filter.include)
+
+        for _ in range(ROTATION_ATTEMPTS):
+            position = rotation.next(total)
+            if position is None:
+                return None
+            if self._accepts(position + 1, include_ids, exclude_ids, has_include):
+                return self.quote(position + 1)
+
+        return self.pick(quote_filter)
+
+    def by_author(self, author, limit=10, offset=0):
+        """Quotes by ``author`` (case-insensitive exact match), in corpus order."""
+        rows = self.conn.execute(
+            "SELECT quote, author FROM quotes WHERE author_key = ? ORDER BY id LIMIT ? OFFSET ?",
+            (author.strip().lower(), limit, offset),
+        )
+        return [{"quote": quote, "author": name} for quote, name in rows]
+
+    def by_tag(self, tag, limit=10, offset=0):
+        """Quotes carrying exactly the tag ``tag`` (case-insensitive), in corpus order."""
+        rows = self.conn.execute(
+            "SELECT q.quote, q.author FROM quote_tags qt JOIN quotes q ON q.id = qt.quote_id "
+            "WHERE qt.tag_id = (SELECT id FROM tags WHERE name = ?) ORDER BY qt.quote_id LIMIT ? OFFSET ?",
+            (tag.strip().lower(), limit, offset),
+        )
+        return [{"quote": quote, "author": author} for quote, author in rows]
+
+    def search(self, query, limit=10, offset=0):
+        """Full-text search over quote text and author, in corpus order.
+
+        Results are not ranked: ranking has to score every match, which takes
+        hundreds of milliseconds for common words on the full corpus.
+        """
+        # Quote every word so user input is never parsed as FTS syntax.
+        terms = " ".join('"{}"'.format(word.replace('"', '""')) for word in query.split())
+        if not terms:
+            return []
+        rows = self.conn.execute(
+            "SELECT quote, author FROM quotes_fts WHERE quotes_fts MATCH ? LIMIT ? OFFSET ?",
+            (terms, limit, offset),
+        )
+        return [{"quote": quote, "author": author} for quote, author in rows]
+
+
+class _Limited(io.RawIOBase):
+    """Read-only view of the next ``remaining`` bytes of a binary file."""
+
+    def __init__(self, file, remaining):
+        self.file = file
+        self.remaining = remaining
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            return 0
+        data = self.file.read(min(len(buffer), self.remaining))
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)